@@ -0,0 +1,452 @@
+#! /usr/bin/env python3
+"""
+Benchmarks the three simulators (intro/process_run.py, scheduling/mlfq.py and
+process/fork.py) on fixed-seed workloads of growing size.
+
+Every case runs in a fresh child process that reports the wall time, the
+simulated ticks (or actions) per second, the peak RSS and, in a second run
+under tracemalloc, the peak memory allocated by Python. The SHA-256 digest of
+everything the simulator printed is checked against golden.json, so a change
+to a trace or to the stats is caught as a regression.
+"""
+from argparse import ArgumentParser
+import csv
+from collections import deque
+import hashlib
+import json
+import os
+import re
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+GOLDEN_FILE = os.path.join(BENCH_DIR, "golden.json")
+
+SCALES = ("small", "medium", "large")
+
+
+# simulated time, from the -p stats of process_run.py
+def process_run_ticks(output):
+    return int(re.search(r"Stats: Total Time (\d+)", output).group(1))
+
+
+# simulated time, from the final stats of mlfq.py: when the last job ended
+def mlfq_ticks(output):
+    jobs = re.findall(
+        r"startTime\s+(\d+) - response\s+\d+ - turnaround\s+(\d+)", output
+    )
+    return max(int(start) + int(turnaround) for start, turnaround in jobs)
+
+
+# name: (scale, script, arguments, unit, units done: a number, or a function
+# of the end of the output); {bench_dir} in the arguments is this directory,
+# {tmp_dir} a scratch directory of the case
+CASES = {
+    "process_run-small": (
+        "small",
+        "intro/process_run.py",
+        "-l 5:50,5:50,5:50 -s 1 -c -p",
+        "ticks",
+        process_run_ticks,
+    ),
+    "process_run-medium": (
+        "medium",
+        "intro/process_run.py",
+        "-l 3000:80,3000:50,3000:20 -s 2 -L 3 -c -p",
+        "ticks",
+        process_run_ticks,
+    ),
+    "process_run-large": (
+        "large",
+        "intro/process_run.py",
+        "-l " + ",".join(["20000:70"] * 10) + " -s 3 -L 4 -c -p",
+        "ticks",
+        process_run_ticks,
+    ),
+    "process_run-medium-event": (
+        "medium",
+        "intro/process_run.py",
+        "-l 3000:80,3000:50,3000:20 -s 2 -L 3 -c -p -e event",
+        "ticks",
+        process_run_ticks,
+    ),
+    "process_run-ckpt-event": (
+        "medium",
+        "intro/process_run.py",
+        "-l 3000:80,3000:50,3000:20 -s 2 -L 3 -c -p -e event -K {tmp_dir}/ck -k 2000",
+        "ticks",
+        process_run_ticks,
+    ),
+    "process_run-generate": (
+        "medium",
+        "intro/process_run.py",
+        "-G 5:10000:60,5:10000:90 -s 4 -L 3 -c -p -e event",
+        "ticks",
+        process_run_ticks,
+    ),
+    "process_run-window-tick": (
+        "small",
+        "intro/process_run.py",
+        "-l 3000:10,3000:5 -s 2 -L 5 -c -p -w 2000:2503 -e tick",
+        "ticks",
+        process_run_ticks,
+    ),
+    "process_run-window-event": (
+        "small",
+        "intro/process_run.py",
+        "-l 3000:10,3000:5 -s 2 -L 5 -c -p -w 2000:2503 -e event",
+        "ticks",
+        process_run_ticks,
+    ),
+    "mlfq-small": ("small", "scheduling/mlfq.py", "-j 3 -s 1 -c", "ticks", mlfq_ticks),
+    "mlfq-medium": (
+        "medium",
+        "scheduling/mlfq.py",
+        "-j 50 -m 2000 -M 20 -B 100 -s 2 -c",
+        "ticks",
+        mlfq_ticks,
+    ),
+    "mlfq-large": (
+        "large",
+        "scheduling/mlfq.py",
+        "-j 500 -m 20000 -M 50 -B 200 -s 3 -c",
+        "ticks",
+        mlfq_ticks,
+    ),
+    "mlfq-medium-event": (
+        "medium",
+        "scheduling/mlfq.py",
+        "-j 50 -m 2000 -M 20 -B 100 -s 2 -c -e event",
+        "ticks",
+        mlfq_ticks,
+    ),
+    "mlfq-large-stats-only": (
+        "large",
+        "scheduling/mlfq.py",
+        "-j 500 -m 20000 -M 50 -B 200 -s 3 -c -e event --stats-only",
+        "ticks",
+        mlfq_ticks,
+    ),
+    "mlfq-file": (
+        "medium",
+        "scheduling/mlfq.py",
+        "-f {bench_dir}/mlfq_jobs.txt -B 500 -c -e event --stats-only",
+        "jobs",
+        400,
+    ),
+    "fork-small": ("small", "process/fork.py", "-s 1 -a 20 -c", "actions", 20),
+    "fork-medium": ("medium", "process/fork.py", "-s 2 -a 2000 -c", "actions", 2000),
+    "fork-diff": ("medium", "process/fork.py", "-s 2 -a 2000 -c -d", "actions", 2000),
+    "fork-file": (
+        "medium",
+        "process/fork.py",
+        "-i {bench_dir}/fork_actions.txt -c -d",
+        "actions",
+        5000,
+    ),
+    "fork-large": (
+        "large",
+        "process/fork.py",
+        "-s 3 -a 50000 -F -c",
+        "actions",
+        50000,
+    ),
+}
+
+# cases that must print exactly the same thing (e.g. the same run on two
+# engines), whatever golden.json says
+SAME_OUTPUT = (
+    ("process_run-medium", "process_run-medium-event"),
+    ("process_run-medium", "process_run-ckpt-event"),
+    ("process_run-window-tick", "process_run-window-event"),
+    ("mlfq-medium", "mlfq-medium-event"),
+)
+
+# the files that cases must leave in their {tmp_dir}
+EXPECTED_FILES = {
+    "process_run-ckpt-event": [f"ck-{t}.ckpt" for t in range(2000, 16914, 2000)],
+}
+
+
+class DigestWriter:
+    """
+    Stands in for sys.stdout in the child: hashes everything written to it,
+    in large batches, and only keeps the last `keep` characters.
+    """
+
+    def __init__(self, keep=1 << 18, batch=1 << 16) -> None:
+        self.digest = hashlib.sha256()
+        self.keep = keep
+        self.batch = batch
+        self.pending = []
+        self.pending_size = 0
+        self.tail = deque()
+        self.tail_size = 0
+        self.size = 0
+        return
+
+    def write(self, text):
+        self.pending.append(text)
+        self.pending_size += len(text)
+        if self.pending_size >= self.batch:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending_size == 0:
+            return
+        text = "".join(self.pending)
+        data = text.encode()
+        self.digest.update(data)
+        self.size += len(data)
+        self.pending = []
+        self.pending_size = 0
+        self.tail.append(text)
+        self.tail_size += len(text)
+        while self.tail_size - len(self.tail[0]) >= self.keep:
+            self.tail_size -= len(self.tail.popleft())
+        return
+
+    def get_tail(self):
+        self.flush()
+        return "".join(self.tail)
+
+
+# runs script as __main__ with the given arguments and prints the results as
+# JSON; executed in the child process
+def run_child(script, script_args, trace_allocations):
+    out = DigestWriter()
+    sys.argv = [script] + script_args
+    sys.path.insert(0, os.path.dirname(script))
+    stdout = sys.stdout
+    sys.stdout = out
+    if trace_allocations:
+        tracemalloc.start()
+    status = 0
+    start = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name="__main__")
+    except SystemExit as e:
+        if e.code is not None:
+            status = e.code
+    wall = time.perf_counter() - start
+    alloc_peak = None
+    if trace_allocations:
+        alloc_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    sys.stdout = stdout
+
+    # ru_maxrss is in KB on Linux, in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        rss *= 1024
+    tail = out.get_tail()
+    print(
+        json.dumps(
+            {
+                "status": status,
+                "wall": wall,
+                "rss": rss,
+                "alloc_peak": alloc_peak,
+                "digest": out.digest.hexdigest(),
+                "output_size": out.size,
+                "tail": tail,
+            }
+        )
+    )
+    return
+
+
+def spawn(script, script_args, trace_allocations):
+    cmd = [sys.executable, os.path.abspath(__file__), "--child", script]
+    if trace_allocations:
+        cmd.append("--traceAllocations")
+    cmd += ["--"] + script_args
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        # (a child killed by a signal, e.g. by the OOM killer, may say nothing)
+        stderr = result.stderr.strip().splitlines()
+        if len(stderr) == 0:
+            return {"status": f"crashed with return code {result.returncode}"}
+        return {"status": "crashed: " + stderr[-1]}
+    return json.loads(result.stdout)
+
+
+# runs one case and returns its report row
+def run_case(name, trace_allocations):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        return run_case_in(name, trace_allocations, tmp_dir)
+
+
+def run_case_in(name, trace_allocations, tmp_dir):
+    scale, script, script_args, unit, units = CASES[name]
+    script = os.path.join(REPO_DIR, script)
+    script_args = [
+        arg.format(bench_dir=BENCH_DIR, tmp_dir=tmp_dir) for arg in script_args.split()
+    ]
+    result = spawn(script, script_args, False)
+    row = {"case": name, "scale": scale, "status": result["status"]}
+    if result["status"] != 0:
+        return row
+    files = sorted(os.listdir(tmp_dir))
+    if name in EXPECTED_FILES and files != sorted(EXPECTED_FILES[name]):
+        row["status"] = "wrote " + (", ".join(files) or "no files")
+        return row
+    if callable(units):
+        units = units(result["tail"])
+    row["wall"] = result["wall"]
+    row["unit"] = unit
+    row["units"] = units
+    row["rate"] = units / result["wall"] if result["wall"] > 0 else 0.0
+    row["rss"] = result["rss"]
+    row["output_size"] = result["output_size"]
+    row["digest"] = result["digest"]
+    if trace_allocations:
+        row["alloc_peak"] = spawn(script, script_args, True)["alloc_peak"]
+    return row
+
+
+def make_parser():
+    parser = ArgumentParser(
+        description="benchmark process_run.py, mlfq.py and fork.py and check their output"
+    )
+    parser.add_argument(
+        "-s",
+        "--scale",
+        help="largest workloads to run: small, medium or large",
+        default="medium",
+        choices=SCALES,
+        action="store",
+        dest="scale",
+    )
+    parser.add_argument(
+        "-k",
+        "--cases",
+        help="only run the cases whose name contains this string",
+        default="",
+        action="store",
+        dest="cases",
+    )
+    parser.add_argument(
+        "-n",
+        "--noAllocations",
+        help="skip the (slower) run under tracemalloc",
+        default=False,
+        action="store_true",
+        dest="no_allocations",
+    )
+    parser.add_argument(
+        "-u",
+        "--updateGolden",
+        help="record the output digests of the cases that ran as the golden ones",
+        default=False,
+        action="store_true",
+        dest="update_golden",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="also write the results to this CSV file",
+        default="",
+        action="store",
+        dest="output",
+    )
+    return parser
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        trace_allocations = sys.argv[3] == "--traceAllocations"
+        script_args = sys.argv[sys.argv.index("--") + 1 :]
+        run_child(sys.argv[2], script_args, trace_allocations)
+        return
+
+    args = make_parser().parse_args()
+    max_scale = SCALES.index(args.scale)
+    names = [
+        name
+        for name, case in CASES.items()
+        if SCALES.index(case[0]) <= max_scale and args.cases in name
+    ]
+
+    golden = {}
+    if os.path.exists(GOLDEN_FILE):
+        with open(GOLDEN_FILE) as f:
+            golden = json.load(f)
+
+    print(
+        f"{'case':<26} {'wall (s)':>10} {'rate (/s)':>14} {'peak RSS (MB)':>14} "
+        + f"{'alloc (MB)':>11}  output"
+    )
+    rows = []
+    failed = False
+    for name in names:
+        row = run_case(name, not args.no_allocations)
+        rows.append(row)
+        if row["status"] != 0:
+            row["check"] = f"FAILED ({row['status']})"
+            failed = True
+            print(f"{name:<26} {row['check']}")
+            continue
+        if args.update_golden:
+            golden[name] = row["digest"]
+            row["check"] = "recorded"
+        elif name not in golden:
+            row["check"] = "no golden digest"
+        elif golden[name] == row["digest"]:
+            row["check"] = "ok"
+        else:
+            row["check"] = "CHANGED"
+            failed = True
+        alloc = "-"
+        if "alloc_peak" in row:
+            alloc = f"{row['alloc_peak'] / 2**20:.1f}"
+        rate = f"{row['rate']:.0f} {row['unit']}"
+        print(
+            f"{name:<26} {row['wall']:>10.3f} {rate:>14} {row['rss'] / 2**20:>14.1f} "
+            + f"{alloc:>11}  {row['check']}"
+        )
+
+    digests = {row["case"]: row.get("digest") for row in rows}
+    for first, second in SAME_OUTPUT:
+        if first in digests and second in digests:
+            if digests[first] is None or digests[first] != digests[second]:
+                print(f"{first} and {second} printed different output")
+                failed = True
+
+    if args.update_golden:
+        with open(GOLDEN_FILE, "w") as f:
+            json.dump(golden, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+    if args.output != "":
+        fields = [
+            "case",
+            "scale",
+            "wall",
+            "unit",
+            "units",
+            "rate",
+            "rss",
+            "alloc_peak",
+            "output_size",
+            "digest",
+            "check",
+        ]
+        with open(args.output, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(rows)
+
+    if failed:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
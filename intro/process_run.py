@@ -1,25 +1,36 @@
 #! /usr/bin/env python
 from argparse import ArgumentParser
+from collections import deque
+import gc
+import heapq
+import json
+import pickle
 import sys
 import random
+from enum import IntEnum
+
 
 # process states
-STATE_READY = "READY"
-STATE_RUNNING = "RUNNING"
-STATE_DONE = "DONE"
-STATE_WAIT = "BLOCKED"
+class ProcState(IntEnum):
+    READY = 0
+    RUNNING = 1
+    BLOCKED = 2
+    DONE = 3
+
 
-# members of process structure
-PROC_ID = "pid_"
-PROC_CODE = "code_"
-PROC_PC = "pc_"
-PROC_STATE = "proc_state_"
+STATE_READY = ProcState.READY
+STATE_RUNNING = ProcState.RUNNING
+STATE_DONE = ProcState.DONE
+STATE_WAIT = ProcState.BLOCKED
 
 # process tasks
 DO_COMPUTE = "cpu"
 DO_IO = "io"
 DO_IO_DONE = "io_done"
 
+# most random draws made at once by generate()
+GENERATE_CHUNK = 1 << 20
+
 # I/O finished behavior
 IO_RUN_LATER = "IO_RUN_LATER"
 IO_RUN_IMMEDIATE = "IO_RUN_IMMEDIATE"
@@ -28,25 +39,459 @@ IO_RUN_IMMEDIATE = "IO_RUN_IMMEDIATE"
 SCHED_SWITCH_ON_IO = "SWITCH_ON_IO"
 SCHED_SWITCH_ON_END = "SWITCH_ON_END"
 
+# simulation engines
+ENGINE_TICK = "tick"
+ENGINE_EVENT = "event"
+
+# scheduling policies
+POLICY_PID = "PID"
+POLICY_FIFO = "FIFO"
+POLICY_SJF = "SJF"
+POLICY_STCF = "STCF"
+POLICY_RR = "RR"
+POLICY_LOTTERY = "LOTTERY"
+
+
+# process control block
+class Process:
+    __slots__ = ("pid", "code", "pc", "offset", "left", "state")
+
+    def __init__(self, pid) -> None:
+        self.pid = pid
+        # the code is a list of (instruction, count) segments; pc is the
+        # current segment, and offset how much of it has been executed
+        self.code = []
+        self.pc = 0
+        self.offset = 0
+        # instructions not executed yet
+        self.left = 0
+        self.state = STATE_READY
+        return
+
+
+# Collects the trace of a run as JSON Lines, one record per clock tick, and
+# writes it to out in large chunks; close() adds a summary record with the
+# per-process stats, which cover the whole run even when only the ticks of a
+# window (-w) or after a resume (-r) are written:
+#   response: ticks before the first instruction ran
+#   turnaround: ticks until the last instruction ran
+#   wait, cpu, io: ticks spent READY, running, and BLOCKED
+#   io_overlap: ticks spent BLOCKED while a CPU was busy
+class JsonTrace:
+    def __init__(self, out, num_procs, chunk_lines=8192) -> None:
+        self.out = out
+        self.chunk_lines = chunk_lines
+        self.lines = []
+        self.total_time = 0
+        self.cpu_busy = 0
+        self.io_busy = 0
+        # ticks in which both a CPU and I/O were busy
+        self.overlap = 0
+        self.first_run = [-1] * num_procs
+        self.last_run = [-1] * num_procs
+        self.wait_time = [0] * num_procs
+        self.cpu_time = [0] * num_procs
+        self.io_time = [0] * num_procs
+        self.io_overlap = [0] * num_procs
+        return
+
+    # checkpoints keep the stats, but not the output
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["out"]
+        del state["lines"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.out = None
+        self.lines = []
+        return
+
+    def add(self, record):
+        self.lines.append(json.dumps(record, separators=(",", ":")))
+        if len(self.lines) >= self.chunk_lines:
+            self.flush()
+        return
+
+    def flush(self):
+        if len(self.lines) > 0:
+            self.lines.append("")
+            self.out.write("\n".join(self.lines))
+            self.lines = []
+        return
+
+    # states: per pid, its state or RUN:instruction; cpus: per CPU, the pid
+    # that ran on it (None if idle); ios: outstanding I/Os (per device);
+    # record: False to only count the tick in the stats
+    def add_tick(self, clock_tick, io_done, states, cpus, ios, record=True):
+        if record:
+            self.add(
+                {
+                    "type": "tick",
+                    "time": clock_tick,
+                    "io_done": io_done,
+                    "states": states,
+                    "cpus": cpus,
+                    "ios": ios,
+                }
+            )
+        self.total_time = clock_tick
+        cpu_busy = cpus.count(None) < len(cpus)
+        io_busy = sum(ios) > 0
+        self.cpu_busy += cpu_busy
+        self.io_busy += io_busy
+        self.overlap += cpu_busy and io_busy
+        for pid, state in enumerate(states):
+            if state.startswith("RUN:"):
+                if self.first_run[pid] == -1:
+                    self.first_run[pid] = clock_tick
+                self.last_run[pid] = clock_tick
+                self.cpu_time[pid] += 1
+            elif state == STATE_READY.name:
+                self.wait_time[pid] += 1
+            elif state == STATE_WAIT.name:
+                self.io_time[pid] += 1
+                self.io_overlap[pid] += cpu_busy
+        return
+
+    def close(self):
+        procs = []
+        for pid in range(len(self.first_run)):
+            proc = {
+                "pid": pid,
+                "response": None,
+                "turnaround": None,
+                "wait": self.wait_time[pid],
+                "cpu": self.cpu_time[pid],
+                "io": self.io_time[pid],
+                "io_overlap": self.io_overlap[pid],
+            }
+            if self.first_run[pid] != -1:
+                proc["response"] = self.first_run[pid] - 1
+                proc["turnaround"] = self.last_run[pid]
+            procs.append(proc)
+        ran = [proc for proc in procs if proc["response"] is not None]
+        summary = {
+            "type": "summary",
+            "total_time": self.total_time,
+            "cpu_busy": self.cpu_busy,
+            "io_busy": self.io_busy,
+            "overlap": self.overlap,
+            "avg_response": None,
+            "avg_turnaround": None,
+            "avg_wait": None,
+            "processes": procs,
+        }
+        if len(ran) > 0:
+            for key in ("response", "turnaround", "wait"):
+                summary["avg_" + key] = sum(proc[key] for proc in ran) / len(ran)
+        self.add(summary)
+        self.flush()
+        return
+
+
+# binary indexed tree over the weights of indices 0..size-1
+class FenwickTree:
+    def __init__(self, size) -> None:
+        self.size = size
+        self.tree = [0] * (size + 1)
+        self.total = 0
+        return
+
+    def add(self, index, delta):
+        self.total += delta
+        index += 1
+        while index <= self.size:
+            self.tree[index] += delta
+            index += index & -index
+        return
+
+    # sum of the weights of indices 0..index
+    def prefix(self, index):
+        total = 0
+        index += 1
+        while index > 0:
+            total += self.tree[index]
+            index -= index & -index
+        return total
+
+    # the smallest index whose prefix sum is greater than k
+    def find(self, k):
+        index = 0
+        step = 1 << self.size.bit_length()
+        while step > 0:
+            if index + step <= self.size and self.tree[index + step] <= k:
+                index += step
+                k -= self.tree[index]
+            step >>= 1
+        return index
+
+
+# A policy keeps track of the READY processes and decides which one runs
+# next. The scheduler tells it about every process that becomes READY (add)
+# or leaves the READY state (remove), and asks it for the next process to
+# run (pick, which does not remove it) and whether the running process
+# should be preempted
+class Policy:
+    def __init__(self, scheduler) -> None:
+        self.scheduler = scheduler
+        return
+
+    # called once before running with the processes of this ready queue,
+    # which are all READY
+    def start(self, pids):
+        for pid in pids:
+            self.add(pid)
+        return
+
+    def add(self, pid):
+        return
+
+    def remove(self, pid):
+        return
+
+    # the READY process to run next, -1 if there is none
+    def pick(self, curr_pid):
+        return -1
+
+    # how many more ticks the running process pid, which has run for
+    # ticks_run ticks since it was last scheduled, may run before it is
+    # preempted; sys.maxsize if it cannot be
+    def ticks_to_preempt(self, pid, ticks_run):
+        return sys.maxsize
+
+
+# the next READY process after the current one, in pid order (the original
+# behavior)
+class PidPolicy(Policy):
+    def start(self, pids):
+        self.ready = FenwickTree(len(self.scheduler.proc_info))
+        Policy.start(self, pids)
+        return
+
+    def add(self, pid):
+        self.ready.add(pid, 1)
+        return
+
+    def remove(self, pid):
+        self.ready.add(pid, -1)
+        return
+
+    def pick(self, curr_pid):
+        if self.ready.total == 0:
+            return -1
+        before = self.ready.prefix(curr_pid)
+        if before == self.ready.total:
+            # wrap around
+            before = 0
+        return self.ready.find(before)
+
+
+# Policies whose READY structure cannot remove arbitrary entries: remove()
+# does nothing, and an entry is skipped later if its process has left the
+# READY state (or became READY again, with a newer entry) since it was added
+class LazyPolicy(Policy):
+    def __init__(self, scheduler) -> None:
+        Policy.__init__(self, scheduler)
+        self.seq = {}
+        return
+
+    # the sequence number of a new entry for pid
+    def next_seq(self, pid):
+        self.seq[pid] = self.seq.get(pid, 0) + 1
+        return self.seq[pid]
+
+    def is_stale(self, pid, seq):
+        return (
+            self.scheduler.proc_info[pid].state != STATE_READY or self.seq[pid] != seq
+        )
+
+
+# first come, first served: in the order the processes became READY
+class FifoPolicy(LazyPolicy):
+    def __init__(self, scheduler) -> None:
+        LazyPolicy.__init__(self, scheduler)
+        self.ready = deque()
+        return
+
+    def add(self, pid):
+        self.ready.append((pid, self.next_seq(pid)))
+        return
+
+    def pick(self, curr_pid):
+        while len(self.ready) > 0 and self.is_stale(*self.ready[0]):
+            self.ready.popleft()
+        if len(self.ready) == 0:
+            return -1
+        return self.ready[0][0]
+
+
+# FIFO, but the running process goes to the back of the queue once it has
+# used up its quantum
+class RoundRobinPolicy(FifoPolicy):
+    def ticks_to_preempt(self, pid, ticks_run):
+        if self.pick(pid) == -1:
+            # nothing else to run
+            return sys.maxsize
+        return max(self.scheduler.quantum - ticks_run, 0)
+
+
+# shortest job first: the process with the fewest instructions in total
+class SjfPolicy(LazyPolicy):
+    def __init__(self, scheduler) -> None:
+        LazyPolicy.__init__(self, scheduler)
+        self.ready = []
+        self.length = {}
+        return
+
+    def start(self, pids):
+        for pid in pids:
+            self.length[pid] = self.scheduler.get_num_instructions(pid)
+        LazyPolicy.start(self, pids)
+        return
+
+    def key(self, pid):
+        return self.length[pid]
+
+    def add(self, pid):
+        heapq.heappush(self.ready, (self.key(pid), pid, self.next_seq(pid)))
+        return
+
+    def pick(self, curr_pid):
+        while len(self.ready) > 0 and self.is_stale(*self.ready[0][1:]):
+            heapq.heappop(self.ready)
+        if len(self.ready) == 0:
+            return -1
+        return self.ready[0][1]
+
+
+# shortest time to completion first: the process with the fewest instructions
+# left, preempting the running process when a shorter one is READY
+class StcfPolicy(SjfPolicy):
+    def key(self, pid):
+        return self.scheduler.get_num_instructions(pid)
+
+    def ticks_to_preempt(self, pid, ticks_run):
+        best = self.pick(pid)
+        if best != -1 and self.ready[0][0] < self.key(pid):
+            return 0
+        # the READY processes only change at I/O completions
+        return sys.maxsize
+
+
+# lottery scheduling: a random READY process, weighted by its tickets
+class LotteryPolicy(Policy):
+    def start(self, pids):
+        self.ready = FenwickTree(len(self.scheduler.proc_info))
+        Policy.start(self, pids)
+        return
+
+    def tickets(self, pid):
+        if pid < len(self.scheduler.tickets):
+            return self.scheduler.tickets[pid]
+        return 1
+
+    def add(self, pid):
+        self.ready.add(pid, self.tickets(pid))
+        return
+
+    def remove(self, pid):
+        self.ready.add(pid, -self.tickets(pid))
+        return
+
+    def pick(self, curr_pid):
+        if self.ready.total == 0:
+            return -1
+        return self.ready.find(random.randrange(self.ready.total))
+
+
+POLICIES = {
+    POLICY_PID: PidPolicy,
+    POLICY_FIFO: FifoPolicy,
+    POLICY_SJF: SjfPolicy,
+    POLICY_STCF: StcfPolicy,
+    POLICY_RR: RoundRobinPolicy,
+    POLICY_LOTTERY: LotteryPolicy,
+}
+
 
 class Scheduler:
-    def __init__(self, process_switch_behavior, io_done_behavior, io_duration) -> None:
+    def __init__(
+        self,
+        process_switch_behavior,
+        io_done_behavior,
+        io_duration,
+        policy=POLICY_PID,
+        quantum=1,
+        tickets=(),
+        num_cpus=1,
+        per_cpu_queues=False,
+        num_devices=0,
+        device_times=(),
+    ) -> None:
         self.proc_info = {}
         self.curr_proc = -1
         self.process_switch_behavior = process_switch_behavior
         self.io_done_behavior = io_done_behavior
         self.io_duration = io_duration
+        self.quantum = quantum
+        # per pid; processes without an entry get one ticket
+        self.tickets = tickets
+        # one ready queue, or one per CPU (process P uses that of CPU P % N)
+        self.num_cpus = num_cpus
+        num_queues = 1
+        if per_cpu_queues:
+            num_queues = num_cpus
+        self.policies = [POLICIES[policy](self) for q in range(num_queues)]
+        self.policy = self.policies[0]
+        # 0 devices: every I/O is served right away, in parallel; otherwise
+        # process P uses device P % M, with its own service time
+        self.num_devices = num_devices
+        self.device_times = [io_duration] * num_devices
+        for d, t in enumerate(device_times[:num_devices]):
+            self.device_times[d] = t
+        # ticks the current process has run since it was last scheduled
+        self.curr_ticks = 0
+        # a JsonTrace to export the run to, if any
+        self.trace = None
+        # only the ticks trace_start..trace_end are traced, and the run stops
+        # after trace_end
+        self.trace_start = 1
+        self.trace_end = sys.maxsize
+        # periodic checkpoints, and where a run resumed from one carries on
+        self.checkpoint_prefix = ""
+        self.checkpoint_every = 0
+        self.next_checkpoint = sys.maxsize
+        self.resume_point = None
+        # number of processes in each state
+        self.state_counts = [0] * len(ProcState)
+        # outstanding I/Os: completion time -> pids, and a min-heap of the
+        # completion times
+        self.io_completions = {}
+        self.io_done_times = []
+        self.num_ios_in_flight = 0
         return
 
     def new_process(self):
         proc_id = len(self.proc_info)
-        self.proc_info[proc_id] = {}
-        self.proc_info[proc_id][PROC_ID] = proc_id
-        self.proc_info[proc_id][PROC_PC] = 0
-        self.proc_info[proc_id][PROC_CODE] = []
-        self.proc_info[proc_id][PROC_STATE] = STATE_READY
+        self.proc_info[proc_id] = Process(proc_id)
+        self.state_counts[STATE_READY] += 1
         return proc_id
 
+    # append count instructions to the code of pid; a compute burst right
+    # after another one just makes the last segment longer
+    def add_instructions(self, pid, instruction, count=1):
+        code = self.proc_info[pid].code
+        if count <= 0:
+            return
+        self.proc_info[pid].left += count
+        if instruction == DO_COMPUTE and len(code) > 0 and code[-1][0] == DO_COMPUTE:
+            code[-1] = (DO_COMPUTE, code[-1][1] + count)
+        else:
+            code.append((instruction, count))
+        return
+
     # program looks like this:
     #   c6,i,c4,i
     # which means
@@ -57,12 +502,11 @@ class Scheduler:
             opcode = line[0]
             if opcode == "c":  # compute
                 count = int(line[1:])
-                for i in range(count):
-                    self.proc_info[proc_id][PROC_CODE].append(DO_COMPUTE)
+                self.add_instructions(proc_id, DO_COMPUTE, count)
             elif opcode == "i":  # I/O
-                self.proc_info[proc_id][PROC_CODE].append(DO_IO)
+                self.add_instructions(proc_id, DO_IO)
                 # add one compute to handle I/O completion
-                self.proc_info[proc_id][PROC_CODE].append(DO_IO_DONE)
+                self.add_instructions(proc_id, DO_IO_DONE)
             else:
                 # print("Bad opcode %s (should be `c` or `i`)!" % opcode)
                 print(f"Bad opcode {opcode} (should be `c` or `i`)!")
@@ -80,83 +524,262 @@ class Scheduler:
         num_instructions, chance_cpu = int(tmp[0]), float(tmp[1]) / 100.0
         for i in range(num_instructions):
             if random.random() < chance_cpu:
-                self.proc_info[proc_id][PROC_CODE].append(DO_COMPUTE)
+                self.add_instructions(proc_id, DO_COMPUTE)
             else:
-                self.proc_info[proc_id][PROC_CODE].append(DO_IO)
-                self.proc_info[proc_id][PROC_CODE].append(DO_IO_DONE)
+                self.add_instructions(proc_id, DO_IO)
+                self.add_instructions(proc_id, DO_IO_DONE)
+        return
+
+    # Like load(), but for many processes at once: "N:X:Y" adds N processes
+    # of X instructions, each with a Y percent chance of being CPU; the
+    # compute bursts between I/Os are thus geometric. All the random draws
+    # are made with NumPy, seeded by rng (a seed or a numpy.random.Generator),
+    # and the bursts go straight into the segments of the code
+    def generate(self, workload_description, rng):
+        # imported here, so that NumPy is only needed (and loaded) for -G
+        try:
+            import numpy as np
+        except ImportError:
+            print("Generating workloads (-G) requires NumPy")
+            sys.exit(1)
+        tmp = workload_description.split(":")
+        if len(tmp) != 3:
+            print(f"Bad description ({workload_description}): Must be number <n:x:y>")
+            print("  where N is the number of processes,")
+            print("  X is the number of instructions of each process,")
+            print("  and Y is the percent chance that an instruction is CPU, not I/O")
+            sys.exit(1)
+        num_procs, num_instructions = int(tmp[0]), int(tmp[1])
+        chance_cpu = float(tmp[2]) / 100.0
+        rng = np.random.default_rng(rng)
+
+        # segments are immutable, so all the slots with the same content share
+        # one: table[length + 2] is the segment of a slot (see below), made
+        # the first time it is needed
+        table = np.empty(num_instructions + 3, dtype=object)
+        table[0] = (DO_IO_DONE, 1)
+        table[1] = (DO_IO, 1)
+        made = np.zeros(num_instructions + 3, dtype=bool)
+        made[:2] = True
+
+        # millions of (acyclic) objects are made below: without the cyclic GC,
+        # which would otherwise rescan all the code lists built so far
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            chunk_procs = max(GENERATE_CHUNK // max(num_instructions, 1), 1)
+            for first in range(0, num_procs, chunk_procs):
+                rows = min(chunk_procs, num_procs - first)
+                # (process, instruction) of every I/O, in order
+                row, col = np.nonzero(
+                    rng.random((rows, num_instructions)) >= chance_cpu
+                )
+                num_ios = np.bincount(row, minlength=rows)
+                first_io = np.cumsum(num_ios) - num_ios
+                has_io = num_ios > 0
+
+                # the code of a process is a compute burst, an I/O and an I/O
+                # done per I/O, then a last compute burst: lay all of them out as
+                # slots of one array, with the length of the compute bursts
+                num_slots = 3 * num_ios + 1
+                first_slot = np.cumsum(num_slots) - num_slots
+                lengths = np.zeros(num_slots.sum(), dtype=np.int64)
+                io_slot = first_slot[row] + 3 * (np.arange(len(col)) - first_io[row])
+                prev = np.empty_like(col)
+                prev[1:] = col[:-1]
+                prev[first_io[has_io]] = -1
+                lengths[io_slot] = col - prev - 1
+                lengths[io_slot + 1] = -1
+                lengths[io_slot + 2] = -2
+                last = np.full(rows, -1)
+                last[has_io] = col[first_io[has_io] + num_ios[has_io] - 1]
+                lengths[first_slot + 3 * num_ios] = num_instructions - 1 - last
+
+                # empty compute bursts are dropped
+                keep = lengths != 0
+                slot_segment = lengths[keep] + 2
+                new = np.zeros_like(made)
+                new[slot_segment] = True
+                new &= ~made
+                for i in np.flatnonzero(new).tolist():
+                    table[i] = (DO_COMPUTE, i - 2)
+                made |= new
+                ends = np.cumsum(np.add.reduceat(keep, first_slot)).tolist()
+                segments = table[slot_segment].tolist()
+
+                pid = len(self.proc_info)
+                start = 0
+                for end, n in zip(ends, num_ios.tolist()):
+                    proc = Process(pid)
+                    proc.code = segments[start:end]
+                    proc.left = num_instructions + n
+                    self.proc_info[pid] = proc
+                    pid += 1
+                    start = end
+                self.state_counts[STATE_READY] += rows
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+        return
+
+    # every state change goes through here, to keep the per-state counts
+    def move(self, pid, expected, state):
+        proc = self.proc_info[pid]
+        assert proc.state == expected
+        proc.state = state
+        self.state_counts[expected] -= 1
+        self.state_counts[state] += 1
         return
 
     def move_to_ready(self, expected, pid=-1):
         if pid == -1:
             pid = self.curr_proc
-        assert self.proc_info[pid][PROC_STATE] == expected
-        self.proc_info[pid][PROC_STATE] = STATE_READY
+        self.move(pid, expected, STATE_READY)
+        self.policy_of(pid).add(pid)
         return
 
-    def move_to_wait(self, expected):
-        assert self.proc_info[self.curr_proc][PROC_STATE] == expected
-        self.proc_info[self.curr_proc][PROC_STATE] = STATE_WAIT
+    def move_to_wait(self, expected, pid=-1):
+        if pid == -1:
+            pid = self.curr_proc
+        self.move(pid, expected, STATE_WAIT)
         return
 
-    def move_to_running(self, expected):
-        assert self.proc_info[self.curr_proc][PROC_STATE] == expected
-        self.proc_info[self.curr_proc][PROC_STATE] = STATE_RUNNING
+    def move_to_running(self, expected, pid=-1):
+        if pid == -1:
+            pid = self.curr_proc
+        self.move(pid, expected, STATE_RUNNING)
+        self.policy_of(pid).remove(pid)
+        self.curr_ticks = 0
         return
 
-    def move_to_done(self, expected):
-        assert self.proc_info[self.curr_proc][PROC_STATE] == expected
-        self.proc_info[self.curr_proc][PROC_STATE] = STATE_DONE
+    def move_to_done(self, expected, pid=-1):
+        if pid == -1:
+            pid = self.curr_proc
+        self.move(pid, expected, STATE_DONE)
         return
 
+    # the policy of the ready queue of pid
+    def policy_of(self, pid):
+        return self.policies[pid % len(self.policies)]
+
     def next_proc(self, pid=-1):
         if pid != -1:
             self.curr_proc = pid
             self.move_to_running(STATE_READY)
             return
-        for pid in range(self.curr_proc + 1, len(self.proc_info)):
-            if self.proc_info[pid][PROC_STATE] == STATE_READY:
-                self.curr_proc = pid
-                self.move_to_running(STATE_READY)
-                return
-        for pid in range(0, self.curr_proc + 1):
-            if self.proc_info[pid][PROC_STATE] == STATE_READY:
-                self.curr_proc = pid
-                self.move_to_running(STATE_READY)
-                return
+        pid = self.policy.pick(self.curr_proc)
+        if pid != -1:
+            self.curr_proc = pid
+            self.move_to_running(STATE_READY)
         return
 
     def get_num_processes(self):
         return len(self.proc_info)
 
+    # the instructions of pid that have not been executed yet
+    def get_instructions(self, pid):
+        proc = self.proc_info[pid]
+        offset = proc.offset
+        for instruction, count in proc.code[proc.pc :]:
+            for i in range(count - offset):
+                yield instruction
+            offset = 0
+
     def get_num_instructions(self, pid):
-        return len(self.proc_info[pid][PROC_CODE])
+        return self.proc_info[pid].left
 
     def get_instruction(self, pid, index):
-        return self.proc_info[pid][PROC_CODE][index]
+        proc = self.proc_info[pid]
+        index += proc.offset
+        for instruction, count in proc.code[proc.pc :]:
+            if index < count:
+                return instruction
+            index -= count
+        raise IndexError("instruction index out of range")
+
+    def has_instructions(self, pid):
+        return self.proc_info[pid].pc < len(self.proc_info[pid].code)
+
+    # executes the next instruction of pid, and returns it
+    def next_instruction(self, pid):
+        proc = self.proc_info[pid]
+        instruction, count = proc.code[proc.pc]
+        proc.offset += 1
+        proc.left -= 1
+        if proc.offset == count:
+            proc.pc += 1
+            proc.offset = 0
+        return instruction
+
+    # executes at most max_ticks instructions of pid, stopping after the first
+    # I/O; returns them as (instruction, count) segments
+    def next_burst(self, pid, max_ticks):
+        proc = self.proc_info[pid]
+        code = proc.code
+        burst = []
+        ticks = 0
+        while proc.pc < len(code) and ticks < max_ticks:
+            instruction, count = code[proc.pc]
+            run = min(count - proc.offset, max_ticks - ticks)
+            burst.append((instruction, run))
+            ticks += run
+            proc.offset += run
+            proc.left -= run
+            if proc.offset == count:
+                proc.pc += 1
+                proc.offset = 0
+            if instruction == DO_IO:
+                break
+        return burst
 
+    # processes that are not DONE
     def get_num_active(self):
-        num_active = 0
-        for _, state in self.proc_info.items():
-            if state[PROC_STATE] != STATE_DONE:
-                num_active += 1
-        return num_active
+        return len(self.proc_info) - self.state_counts[STATE_DONE]
 
+    # processes that are READY or RUNNING
     def get_num_runnable(self):
-        num_runnable = 0
-        for _, state in self.proc_info.items():
-            if state[PROC_STATE] == STATE_RUNNING or state[PROC_STATE] == STATE_READY:
-                num_runnable += 1
-        return num_runnable
-
-    def get_ios_in_flight(self, current_time):
-        num_in_flight = 0
-        for pid in self.proc_info:
-            for t in self.io_finish_times[pid]:
-                if t > current_time:
-                    num_in_flight += 1
-        return num_in_flight
+        return self.state_counts[STATE_READY] + self.state_counts[STATE_RUNNING]
+
+    def get_num_in_state(self, state):
+        return self.state_counts[state]
+
+    def get_ios_in_flight(self):
+        return self.num_ios_in_flight
+
+    # pid issues an I/O that completes at done_time
+    def start_io(self, pid, done_time):
+        if done_time not in self.io_completions:
+            self.io_completions[done_time] = []
+            heapq.heappush(self.io_done_times, done_time)
+        self.io_completions[done_time].append(pid)
+        self.num_ios_in_flight += 1
+        return
 
+    # the pids whose I/O completes at clock_tick, in pid order; they are no
+    # longer outstanding afterwards
+    def finish_ios(self, clock_tick):
+        pids = self.io_completions.pop(clock_tick, None)
+        if pids is None:
+            return []
+        assert heapq.heappop(self.io_done_times) == clock_tick
+        self.num_ios_in_flight -= len(pids)
+        pids.sort()
+        return pids
+
+    # time of the next I/O completion, -1 if there is none
+    def next_io_done(self):
+        if len(self.io_done_times) == 0:
+            return -1
+        return self.io_done_times[0]
+
+    # preempts the running process if the policy says its time is up
     def check_for_switch(self):
+        if self.proc_info[self.curr_proc].state != STATE_RUNNING:
+            return
+        if self.policy.ticks_to_preempt(self.curr_proc, self.curr_ticks) > 0:
+            return
+        self.move_to_ready(STATE_RUNNING)
+        self.next_proc()
         return
 
     def space(self, num_columns):
@@ -165,29 +788,68 @@ class Scheduler:
             print(f"{' ':>10}", end="")
 
     def check_if_done(self):
-        if len(self.proc_info[self.curr_proc][PROC_CODE]) == 0:
-            if self.proc_info[self.curr_proc][PROC_STATE] == STATE_RUNNING:
+        if not self.has_instructions(self.curr_proc):
+            if self.proc_info[self.curr_proc].state == STATE_RUNNING:
                 self.move_to_done(STATE_RUNNING)
                 self.next_proc()
         return
 
-    def run(self):
-        clock_tick = 0
+    # the process whose I/O just finished is READY again; decide what runs next
+    def io_done(self, pid):
+        # initially this pid was waiting for I/O to finish
+        # now that I/O has finished, move to ready state
+        self.move_to_ready(STATE_WAIT, pid)
+        if self.io_done_behavior == IO_RUN_IMMEDIATE:
+            # IO_RUN_IMMEDIATE
+            if self.curr_proc != pid:
+                if self.proc_info[self.curr_proc].state == STATE_RUNNING:
+                    self.move_to_ready(STATE_RUNNING)
+            self.next_proc(pid)
+        else:
+            # IO_RUN_LATER
+            if (
+                self.process_switch_behavior == SCHED_SWITCH_ON_END
+                and self.get_num_runnable() > 1
+            ):
+                # the process that issued the I/O should be run
+                self.next_proc(pid)
+            if self.get_num_runnable() == 1:
+                # there is only one thing to run; run it!
+                self.next_proc(pid)
+        self.check_if_done()
+        return
 
-        # Nothing to run, return
-        if len(self.proc_info) == 0:
-            return
+    # only trace the ticks start..end, and stop running after end
+    def set_window(self, start, end):
+        self.trace_start = start
+        self.trace_end = end
+        return
 
-        # Tracking outstanding I/Os, per process
-        self.io_finish_times = {}
-        for pid in self.proc_info:
-            self.io_finish_times[pid] = []
+    # save a checkpoint to prefix-<tick>.ckpt every `every` ticks
+    def set_checkpoints(self, prefix, every):
+        self.checkpoint_prefix = prefix
+        self.checkpoint_every = every
+        clock_tick = 0
+        if self.resume_point is not None:
+            clock_tick = self.resume_point[0]
+        self.next_checkpoint = (clock_tick // every + 1) * every
+        return
 
-        # Make the first process active
-        self.curr_proc = 0
-        self.move_to_running(STATE_READY)
+    # Saves everything needed to carry on from the end of clock_tick (the
+    # processes, their program cursors, the pending I/Os, the policies, the
+    # stats so far, and the state of the random number generator); see
+    # load_checkpoint()
+    def save_checkpoint(self, clock_tick, cpu_busy, io_busy):
+        self.resume_point = (clock_tick, cpu_busy, io_busy)
+        self.next_checkpoint = clock_tick + self.checkpoint_every
+        # (the JSON trace keeps its stats, see JsonTrace.__getstate__)
+        with open(f"{self.checkpoint_prefix}-{clock_tick}.ckpt", "wb") as f:
+            pickle.dump((self, random.getstate()), f, pickle.HIGHEST_PROTOCOL)
+        self.resume_point = None
+        return
 
-        # Output: headers for each column
+    # Output: headers for each column
+    def print_header(self):
         print("Time", end="")
         for pid in self.proc_info:
             header = f"PID:{pid:2}"
@@ -195,90 +857,208 @@ class Scheduler:
         print(f"{'CPU':>14}", end="")
         print(f"{'I/Os':>14}", end="")
         print("")
+        return
+
+    # Output: one line per clock tick
+    def print_tick(self, clock_tick, io_done, instruction_to_execute, num_outstanding):
+        # ticks outside the window still count in the JSON trace's stats
+        in_window = self.trace_start <= clock_tick <= self.trace_end
+        if not in_window and self.trace is None:
+            return
+        states = []
+        for pid in self.proc_info:
+            if pid == self.curr_proc and instruction_to_execute != "":
+                states.append("RUN:" + instruction_to_execute)
+            else:
+                states.append(self.proc_info[pid].state.name)
+
+        if self.trace is not None:
+            cpus = [None]
+            if instruction_to_execute != "":
+                cpus = [self.curr_proc]
+            self.trace.add_tick(
+                clock_tick, io_done, states, cpus, [num_outstanding], in_window
+            )
+        if not in_window:
+            return
+
+        # the whole line is printed at once
+        if io_done:
+            line = [f"{clock_tick:>3}*"]
+        else:
+            line = [f"{clock_tick:>3} "]
+
+        for state in states:
+            line.append(f"{state:>14}")
+
+        # CPU output
+        if instruction_to_execute == "":
+            line.append(f"{' ':>14}")
+        else:
+            line.append(f"{'1':>14}")
+
+        # I/O output
+        if num_outstanding > 0:
+            line.append(f"{str(num_outstanding):>14}")
+        else:
+            line.append(f"{' ':>10}")
+
+        print("".join(line))
+        return
+
+    def run(self, engine=ENGINE_TICK):
+        if self.num_cpus > 1 or self.num_devices > 0:
+            return self.run_multi()
+        if engine == ENGINE_EVENT:
+            return self.run_events()
 
-        # init stats
-        io_busy = 0
-        cpu_busy = 0
+        # Nothing to run, return
+        if len(self.proc_info) == 0:
+            return
+
+        if self.resume_point is None:
+            clock_tick = 0
+            # Make the first process (as chosen by the policy) active
+            self.policy.start(list(self.proc_info))
+            self.next_proc()
+            # init stats
+            io_busy = 0
+            cpu_busy = 0
+        else:
+            clock_tick, cpu_busy, io_busy = self.resume_point
+            self.resume_point = None
+
+        self.print_header()
 
-        while self.get_num_active() > 0:
+        while self.get_num_active() > 0 and clock_tick < self.trace_end:
+            if clock_tick >= self.next_checkpoint:
+                self.save_checkpoint(clock_tick, cpu_busy, io_busy)
             clock_tick += 1
 
             # check for I/O finish
             io_done = False
-            for pid in self.proc_info:
-                if clock_tick in self.io_finish_times[pid]:
-                    io_done = True
-                    # initially this pid was waiting for I/O to finish
-                    # now that I/O has finished, move to ready state
-                    self.move_to_ready(STATE_WAIT, pid)
-                    if self.io_done_behavior == IO_RUN_IMMEDIATE:
-                        # IO_RUN_IMMEDIATE
-                        if self.curr_proc != pid:
-                            if (
-                                self.proc_info[self.curr_proc][PROC_STATE]
-                                == STATE_RUNNING
-                            ):
-                                self.move_to_ready(STATE_RUNNING)
-                        self.next_proc(pid)
-                    else:
-                        # IO_RUN_LATER
-                        if (
-                            self.process_switch_behavior == SCHED_SWITCH_ON_END
-                            and self.get_num_runnable() > 1
-                        ):
-                            # the process that issued the I/O should be run
-                            self.next_proc(pid)
-                        if self.get_num_runnable() == 1:
-                            # there is only one thing to run; run it!
-                            self.next_proc(pid)
-                    self.check_if_done()
+            for pid in self.finish_ios(clock_tick):
+                io_done = True
+                self.io_done(pid)
+
+            self.check_for_switch()
 
             # if curr_proc is running and has an instruction, execute it!
             instruction_to_execute = ""
-            if (
-                self.proc_info[self.curr_proc][PROC_STATE] == STATE_RUNNING
-                and len(self.proc_info[self.curr_proc][PROC_CODE]) > 0
-            ):
-                instruction_to_execute = self.proc_info[self.curr_proc][PROC_CODE].pop(
-                    0
-                )
+            if self.proc_info[
+                self.curr_proc
+            ].state == STATE_RUNNING and self.has_instructions(self.curr_proc):
+                instruction_to_execute = self.next_instruction(self.curr_proc)
+                self.curr_ticks += 1
                 cpu_busy += 1
 
             # OUTPUT - print
-            if io_done:
-                print(f"{clock_tick:>3}*", end="")
-            else:
-                print(f"{clock_tick:>3} ", end="")
-
-            for pid in self.proc_info:
-                if pid == self.curr_proc and instruction_to_execute != "":
-                    instructoin_text = "RUN:" + instruction_to_execute
-                    print(f"{instructoin_text:>14}", end="")
-                else:
-                    print(f"{self.proc_info[pid][PROC_STATE]:>14}", end="")
-
-            # CPU output
-            if instruction_to_execute == "":
-                print(f"{' ':>14}", end="")
-            else:
-                print(f"{'1':>14}", end="")
-
-            # I/O output
-            num_outstanding = self.get_ios_in_flight(clock_tick)
+            num_outstanding = self.get_ios_in_flight()
+            self.print_tick(
+                clock_tick, io_done, instruction_to_execute, num_outstanding
+            )
             if num_outstanding > 0:
-                print(f"{str(num_outstanding):>14}", end="")
                 io_busy += 1
-            else:
-                print(f"{' ':>10}", end="")
-
-            print("")
 
             # if this is I/O - start instrcution, switch to waiting state and add an I/O completion in the future
             if instruction_to_execute == DO_IO:
                 self.move_to_wait(STATE_RUNNING)
-                self.io_finish_times[self.curr_proc].append(
-                    clock_tick + self.io_duration + 1
+                self.start_io(self.curr_proc, clock_tick + self.io_duration + 1)
+                if self.process_switch_behavior == SCHED_SWITCH_ON_IO:
+                    self.next_proc()
+
+            # ENDCASE: check if currently running thing is out of instructions
+            self.check_if_done()
+        return (cpu_busy, io_busy, clock_tick)
+
+    # Same as run(), but instead of looping once per clock tick, jumps from
+    # one event (I/O issue or completion, process end) to the next: a burst
+    # of instructions without I/O, or a stretch of time in which nothing can
+    # run, is handled in a single step
+    # produces the same output and stats as run()
+    def run_events(self):
+        # Nothing to run, return
+        if len(self.proc_info) == 0:
+            return
+
+        if self.resume_point is None:
+            clock_tick = 0
+            # Make the first process (as chosen by the policy) active
+            self.policy.start(list(self.proc_info))
+            self.next_proc()
+            # init stats
+            io_busy = 0
+            cpu_busy = 0
+        else:
+            clock_tick, cpu_busy, io_busy = self.resume_point
+            self.resume_point = None
+
+        self.print_header()
+
+        while self.get_num_active() > 0 and clock_tick < self.trace_end:
+            if clock_tick >= self.next_checkpoint:
+                self.save_checkpoint(clock_tick, cpu_busy, io_busy)
+            clock_tick += 1
+
+            # check for I/O finish (in pid order, like run())
+            io_done = False
+            for pid in self.finish_ios(clock_tick):
+                io_done = True
+                self.io_done(pid)
+
+            self.check_for_switch()
+
+            # nothing but the current process can change before the next I/O
+            # completion (and the simulation stops at the end of the window,
+            # and at the next checkpoint, to save it)
+            ticks = 1
+            next_io_done = self.next_io_done()
+            ticks_left = min(self.trace_end, self.next_checkpoint) - clock_tick + 1
+
+            burst = []
+            proc = self.proc_info[self.curr_proc]
+            if proc.state == STATE_RUNNING and self.has_instructions(self.curr_proc):
+                # run up to (and including) the next I/O instruction
+                # ... or until the policy preempts it
+                max_ticks = self.policy.ticks_to_preempt(
+                    self.curr_proc, self.curr_ticks
                 )
+                if next_io_done != -1:
+                    max_ticks = min(max_ticks, next_io_done - clock_tick)
+                max_ticks = min(max_ticks, ticks_left)
+                burst = self.next_burst(self.curr_proc, max_ticks)
+                ticks = sum(count for _, count in burst)
+                self.curr_ticks += ticks
+                cpu_busy += ticks
+            elif proc.state != STATE_RUNNING and next_io_done != -1:
+                # idle until the next I/O completion
+                ticks = min(next_io_done - clock_tick, ticks_left)
+
+            # OUTPUT - print
+            num_outstanding = self.get_ios_in_flight()
+            if len(burst) == 0:
+                burst = [("", ticks)]
+            i = 0
+            # (fast-forward through the ticks outside the trace window, unless
+            # the JSON trace has to count them)
+            if self.trace is not None or clock_tick + ticks > self.trace_start:
+                for instruction_to_execute, count in burst:
+                    for _ in range(count):
+                        self.print_tick(
+                            clock_tick + i,
+                            io_done and i == 0,
+                            instruction_to_execute,
+                            num_outstanding,
+                        )
+                        i += 1
+            if num_outstanding > 0:
+                io_busy += ticks
+            clock_tick += ticks - 1
+
+            # if this is I/O - start instrcution, switch to waiting state and add an I/O completion in the future
+            if burst[-1][0] == DO_IO:
+                self.move_to_wait(STATE_RUNNING)
+                self.start_io(self.curr_proc, clock_tick + self.io_duration + 1)
                 if self.process_switch_behavior == SCHED_SWITCH_ON_IO:
                     self.next_proc()
 
@@ -286,6 +1066,292 @@ class Scheduler:
             self.check_if_done()
         return (cpu_busy, io_busy, clock_tick)
 
+    # pid runs on cpu from now on
+    def run_on(self, cpu, pid):
+        self.cpu_proc[cpu] = pid
+        self.cpu_last[cpu] = pid
+        self.cpu_ticks[cpu] = 0
+        self.proc_cpu[pid] = cpu
+        self.move_to_running(STATE_READY, pid)
+        return
+
+    # runs the next process of its ready queue on the idle cpu, if any
+    def dispatch(self, cpu):
+        policy = self.policies[cpu % len(self.policies)]
+        pid = policy.pick(self.cpu_last[cpu])
+        if pid != -1:
+            self.run_on(cpu, pid)
+        return
+
+    # an idle CPU that pid can run on, -1 if there is none
+    def idle_cpu(self, pid):
+        if len(self.policies) > 1:
+            cpus = [pid % self.num_cpus]
+        else:
+            cpus = range(self.num_cpus)
+        for cpu in cpus:
+            if self.cpu_proc[cpu] == -1:
+                return cpu
+        return -1
+
+    # same as io_done(), with many CPUs: the process that finished its I/O
+    # goes back to the CPU that waited for it, or with IO_RUN_IMMEDIATE takes
+    # an idle CPU or else the one it ran on last
+    def io_done_multi(self, pid):
+        self.move_to_ready(STATE_WAIT, pid)
+        cpu = self.proc_cpu[pid]
+        if self.cpu_proc[cpu] == pid:
+            # SWITCH_ON_END: the CPU was kept for this process
+            self.run_on(cpu, pid)
+            return
+        if self.io_done_behavior == IO_RUN_IMMEDIATE:
+            cpu = self.idle_cpu(pid)
+            if cpu == -1:
+                cpu = self.proc_cpu[pid]
+                curr = self.cpu_proc[cpu]
+                if self.proc_info[curr].state != STATE_RUNNING:
+                    # kept for a process that is waiting for its I/O
+                    return
+                self.move_to_ready(STATE_RUNNING, curr)
+            self.run_on(cpu, pid)
+        return
+
+    # pid issues an I/O at clock_tick
+    def start_device_io(self, pid, clock_tick):
+        if self.num_devices == 0:
+            self.start_io(pid, clock_tick + self.io_duration + 1)
+            return
+        device = pid % self.num_devices
+        if self.device_proc[device] == -1:
+            self.device_proc[device] = pid
+            self.device_done[device] = clock_tick + self.device_times[device] + 1
+        else:
+            self.device_queue[device].append(pid)
+        return
+
+    # the pids whose I/O completes at clock_tick, in pid order; every device
+    # that finishes a request starts serving the next one in its queue
+    def finish_device_ios(self, clock_tick):
+        if self.num_devices == 0:
+            return self.finish_ios(clock_tick)
+        pids = []
+        for device in range(self.num_devices):
+            while (
+                self.device_proc[device] != -1
+                and self.device_done[device] == clock_tick
+            ):
+                pids.append(self.device_proc[device])
+                self.device_proc[device] = -1
+                if len(self.device_queue[device]) > 0:
+                    self.device_proc[device] = self.device_queue[device].popleft()
+                    self.device_done[device] = clock_tick + self.device_times[device]
+        pids.sort()
+        return pids
+
+    # outstanding I/Os per device (a single count if there are no devices)
+    def get_device_ios_in_flight(self):
+        if self.num_devices == 0:
+            return [self.get_ios_in_flight()]
+        return [
+            int(self.device_proc[device] != -1) + len(self.device_queue[device])
+            for device in range(self.num_devices)
+        ]
+
+    # Output: headers for each column, with many CPUs or devices
+    def print_multi_header(self):
+        print("Time", end="")
+        for pid in self.proc_info:
+            header = f"PID:{pid:2}"
+            print(f"{header:>14}", end="")
+        for cpu in range(self.num_cpus):
+            header = f"CPU:{cpu:2}"
+            print(f"{header:>14}", end="")
+        if self.num_devices == 0:
+            print(f"{'I/Os':>14}", end="")
+        for device in range(self.num_devices):
+            header = f"IO:{device:2}"
+            print(f"{header:>14}", end="")
+        print("")
+        return
+
+    # Output: one line per clock tick, with many CPUs or devices; the CPU
+    # columns show the pid that ran on them
+    def print_multi_tick(self, clock_tick, io_done, executed, outstanding):
+        # ticks outside the window still count in the JSON trace's stats
+        in_window = self.trace_start <= clock_tick <= self.trace_end
+        if not in_window and self.trace is None:
+            return
+        running = {}
+        cpus = []
+        for cpu in range(self.num_cpus):
+            if executed[cpu] != "":
+                running[self.cpu_proc[cpu]] = executed[cpu]
+                cpus.append(self.cpu_proc[cpu])
+            else:
+                cpus.append(None)
+        states = []
+        for pid in self.proc_info:
+            if pid in running:
+                states.append("RUN:" + running[pid])
+            else:
+                states.append(self.proc_info[pid].state.name)
+
+        if self.trace is not None:
+            self.trace.add_tick(
+                clock_tick, io_done, states, cpus, outstanding, in_window
+            )
+        if not in_window:
+            return
+
+        if io_done:
+            line = [f"{clock_tick:>3}*"]
+        else:
+            line = [f"{clock_tick:>3} "]
+
+        for state in states:
+            line.append(f"{state:>14}")
+
+        # CPU output
+        for pid in cpus:
+            if pid is None:
+                line.append(f"{' ':>14}")
+            else:
+                line.append(f"{pid:>14}")
+
+        # I/O output
+        for num_outstanding in outstanding:
+            if num_outstanding > 0:
+                line.append(f"{num_outstanding:>14}")
+            else:
+                line.append(f"{' ':>14}")
+
+        print("".join(line))
+        return
+
+    # Same as run(), with num_cpus CPUs and num_devices I/O devices; also
+    # leaves the busy ticks of every CPU and every device in cpu_busy_ticks
+    # and device_busy_ticks
+    def run_multi(self):
+        # Nothing to run, return
+        if len(self.proc_info) == 0:
+            return
+
+        if self.resume_point is None:
+            clock_tick = 0
+
+            # pid on each CPU (-1 if idle) and the last pid that ran on it,
+            # and the last CPU of each pid
+            self.cpu_proc = [-1] * self.num_cpus
+            self.cpu_last = [-1] * self.num_cpus
+            self.cpu_ticks = [0] * self.num_cpus
+            self.proc_cpu = {}
+
+            # pid being served by each device, when it is done, and the pids
+            # waiting for it
+            self.device_proc = [-1] * self.num_devices
+            self.device_done = [0] * self.num_devices
+            self.device_queue = [deque() for device in range(self.num_devices)]
+
+            # Make the first process of every ready queue active
+            for q, policy in enumerate(self.policies):
+                policy.start(
+                    [pid for pid in self.proc_info if pid % len(self.policies) == q]
+                )
+            for cpu in range(self.num_cpus):
+                self.dispatch(cpu)
+
+            # init stats
+            io_busy = 0
+            cpu_busy = 0
+            self.cpu_busy_ticks = [0] * self.num_cpus
+            self.device_busy_ticks = [0] * self.num_devices
+        else:
+            clock_tick, cpu_busy, io_busy = self.resume_point
+            self.resume_point = None
+
+        self.print_multi_header()
+
+        while self.get_num_active() > 0 and clock_tick < self.trace_end:
+            if clock_tick >= self.next_checkpoint:
+                self.save_checkpoint(clock_tick, cpu_busy, io_busy)
+            clock_tick += 1
+
+            # check for I/O finish
+            io_done = False
+            for pid in self.finish_device_ios(clock_tick):
+                io_done = True
+                self.io_done_multi(pid)
+
+            # preempt the running processes whose time is up, and give the
+            # idle CPUs something to run
+            for cpu in range(self.num_cpus):
+                pid = self.cpu_proc[cpu]
+                if (
+                    pid != -1
+                    and self.proc_info[pid].state == STATE_RUNNING
+                    and self.policy_of(pid).ticks_to_preempt(pid, self.cpu_ticks[cpu])
+                    == 0
+                ):
+                    self.move_to_ready(STATE_RUNNING, pid)
+                    self.cpu_proc[cpu] = -1
+                if self.cpu_proc[cpu] == -1:
+                    self.dispatch(cpu)
+
+            # every CPU with a running process executes an instruction
+            executed = []
+            for cpu in range(self.num_cpus):
+                pid = self.cpu_proc[cpu]
+                instruction_to_execute = ""
+                if (
+                    pid != -1
+                    and self.proc_info[pid].state == STATE_RUNNING
+                    and self.has_instructions(pid)
+                ):
+                    instruction_to_execute = self.next_instruction(pid)
+                    self.cpu_ticks[cpu] += 1
+                    self.cpu_busy_ticks[cpu] += 1
+                executed.append(instruction_to_execute)
+
+            # OUTPUT - print
+            outstanding = self.get_device_ios_in_flight()
+            self.print_multi_tick(clock_tick, io_done, executed, outstanding)
+            if executed.count("") < self.num_cpus:
+                cpu_busy += 1
+            if sum(outstanding) > 0:
+                io_busy += 1
+            for device in range(self.num_devices):
+                if self.device_proc[device] != -1:
+                    self.device_busy_ticks[device] += 1
+
+            # start the I/Os, retire the processes that are done
+            for cpu in range(self.num_cpus):
+                pid = self.cpu_proc[cpu]
+                if executed[cpu] == DO_IO:
+                    self.move_to_wait(STATE_RUNNING, pid)
+                    self.start_device_io(pid, clock_tick)
+                    if self.process_switch_behavior == SCHED_SWITCH_ON_IO:
+                        self.cpu_proc[cpu] = -1
+                elif (
+                    pid != -1
+                    and self.proc_info[pid].state == STATE_RUNNING
+                    and not self.has_instructions(pid)
+                ):
+                    self.move_to_done(STATE_RUNNING, pid)
+                    self.cpu_proc[cpu] = -1
+            for cpu in range(self.num_cpus):
+                if self.cpu_proc[cpu] == -1:
+                    self.dispatch(cpu)
+        return (cpu_busy, io_busy, clock_tick)
+
+
+# A Scheduler saved by save_checkpoint(); run() carries on from where it was
+# saved
+def load_checkpoint(filename):
+    with open(filename, "rb") as f:
+        scheduler, random_state = pickle.load(f)
+    random.setstate(random_state)
+    return scheduler
+
 
 # Parse arguments
 parser = ArgumentParser()
@@ -306,6 +1372,14 @@ parser.add_argument(
     action="store",
     help="more specific controls over programs",
 )
+parser.add_argument(
+    "-G",
+    "--generate",
+    default="",
+    action="store",
+    dest="generate",
+    help="generate many processes at once (requires NumPy), as a comma-separated list of N:X:Y, which adds N processes of X instructions each with a Y percent chance of using the CPU",
+)
 parser.add_argument(
     "-s",
     "--seed",
@@ -340,6 +1414,114 @@ parser.add_argument(
     dest="io_done_behavior",
     help="type of bahavior when I/O ends: IO_RUN_LATER, IO_RUN_IMMEDIATE",
 )
+parser.add_argument(
+    "-y",
+    "--policy",
+    default=POLICY_PID,
+    action="store",
+    dest="policy",
+    help="which process to run next: PID (the next READY one in pid order), FIFO, SJF, STCF, RR (with the -q quantum), LOTTERY (with the -T tickets)",
+)
+parser.add_argument(
+    "-q",
+    "--quantum",
+    default=1,
+    action="store",
+    type=int,
+    dest="quantum",
+    help="length of the RR time slice",
+)
+parser.add_argument(
+    "-T",
+    "--tickets",
+    default="",
+    action="store",
+    dest="tickets",
+    help="a comma-separated list of lottery tickets per process (default: 1 each)",
+)
+parser.add_argument(
+    "-C",
+    "--cpus",
+    default=1,
+    action="store",
+    type=int,
+    dest="num_cpus",
+    help="number of CPUs",
+)
+parser.add_argument(
+    "-Q",
+    "--perCPUQueues",
+    default=False,
+    action="store_true",
+    dest="per_cpu_queues",
+    help="give every CPU its own ready queue (process P runs on CPU P mod N) instead of sharing one",
+)
+parser.add_argument(
+    "-D",
+    "--devices",
+    default=0,
+    action="store",
+    type=int,
+    dest="num_devices",
+    help="number of I/O devices, each serving one I/O at a time in FIFO order (process P uses device P mod M); 0 means all I/Os proceed in parallel",
+)
+parser.add_argument(
+    "-M",
+    "--deviceTimes",
+    default="",
+    action="store",
+    dest="device_times",
+    help="a comma-separated list of the time each device takes to serve an I/O (default: the -L I/O duration)",
+)
+parser.add_argument(
+    "-e",
+    "--engine",
+    default=ENGINE_TICK,
+    action="store",
+    dest="engine",
+    help="simulation engine: tick (one loop per clock tick) or event (jump from one event to the next); both produce the same output. Many CPUs or devices always use a tick engine",
+)
+parser.add_argument(
+    "-j",
+    "--jsonFile",
+    default="",
+    action="store",
+    dest="json_file",
+    help="also write the trace as JSON Lines (one record per tick, then a summary with per-process stats) to this file; only useful with the -c flag (with -w or -r, only the ticks in the window or after the checkpoint are written, but the summary covers the whole run)",
+)
+parser.add_argument(
+    "-K",
+    "--checkpoint",
+    default="",
+    action="store",
+    dest="checkpoint",
+    help="save checkpoints of the simulation, every -k ticks, to files named CHECKPOINT-<tick>.ckpt",
+)
+parser.add_argument(
+    "-k",
+    "--checkpointEvery",
+    default=100000,
+    action="store",
+    type=int,
+    dest="checkpoint_every",
+    help="how many ticks apart the -K checkpoints are",
+)
+parser.add_argument(
+    "-r",
+    "--resume",
+    default="",
+    action="store",
+    dest="resume",
+    help="carry on a simulation from a checkpoint file, instead of starting one (the processes and their behaviors come from the checkpoint)",
+)
+parser.add_argument(
+    "-w",
+    "--window",
+    default="",
+    action="store",
+    dest="window",
+    help="only trace the ticks START:END, fast-forwarding to START and stopping after END",
+)
 parser.add_argument(
     "-c",
     default=False,
@@ -366,14 +1548,54 @@ assert (
 assert (
     args.io_done_behavior == IO_RUN_IMMEDIATE or args.io_done_behavior == IO_RUN_LATER
 )
-s = Scheduler(args.process_switch_behavior, args.io_done_behavior, args.io_duration)
+assert args.engine == ENGINE_TICK or args.engine == ENGINE_EVENT
+assert args.policy in POLICIES
+assert args.quantum > 0
+tickets = []
+if args.tickets != "":
+    tickets = [int(t) for t in args.tickets.split(",")]
+assert all(t > 0 for t in tickets)
+assert args.num_cpus > 0 and args.num_devices >= 0
+device_times = []
+if args.device_times != "":
+    device_times = [int(t) for t in args.device_times.split(",")]
+assert all(t >= 0 for t in device_times)
 
-if args.program != "":
-    for p in args.program.split(":"):
-        s.load_program(p)
+if args.resume != "":
+    if args.solve == False:
+        print("Resuming from a checkpoint (-r) only works with the -c flag")
+        sys.exit(1)
+    try:
+        s = load_checkpoint(args.resume)
+    except OSError as e:
+        print(f"Cannot read checkpoint {args.resume}: {e.strerror}")
+        sys.exit(1)
+    except (pickle.UnpicklingError, EOFError):
+        print(f"{args.resume} is not a checkpoint file")
+        sys.exit(1)
 else:
-    for p in args.process_list.split(","):
-        s.load(p)
+    s = Scheduler(
+        args.process_switch_behavior,
+        args.io_done_behavior,
+        args.io_duration,
+        args.policy,
+        args.quantum,
+        tickets,
+        args.num_cpus,
+        args.per_cpu_queues,
+        args.num_devices,
+        device_times,
+    )
+
+    if args.program != "":
+        for p in args.program.split(":"):
+            s.load_program(p)
+    elif args.generate != "":
+        for i, p in enumerate(args.generate.split(",")):
+            s.generate(p, [args.seed, i])
+    else:
+        for p in args.process_list.split(","):
+            s.load(p)
 
 assert args.io_duration >= 0
 
@@ -381,8 +1603,8 @@ if args.solve == False:
     print("Produce a trace of what would happen when you run these processes:")
     for pid in range(s.get_num_processes()):
         print(f"Process {pid}")
-        for inst in range(s.get_num_instructions(pid)):
-            print(f"  {s.get_instruction(pid, inst)}")
+        for inst in s.get_instructions(pid):
+            print(f"  {inst}")
         print("")
     print("Important behaviors:")
     print("  System will switch when ", end="")
@@ -395,15 +1617,69 @@ if args.solve == False:
         print("run IMMEDIATELY")
     else:
         print("run LATER (when it is its turn)")
+    if args.policy != POLICY_PID:
+        print(f"  The next process to run is chosen by the {args.policy} policy")
+    if args.num_cpus > 1:
+        print(f"  There are {args.num_cpus} CPUs, ", end="")
+        if args.per_cpu_queues:
+            print("each with its own ready queue")
+        else:
+            print("sharing one ready queue")
+    if args.num_devices > 0:
+        print(
+            f"  There are {args.num_devices} I/O devices, each serving one I/O at a time"
+        )
 
     print("")
     sys.exit(0)
 
-(cpu_busy, io_busy, clock_tick) = s.run()
+if args.checkpoint != "":
+    assert args.checkpoint_every > 0
+    s.set_checkpoints(args.checkpoint, args.checkpoint_every)
+
+if args.window != "":
+    try:
+        start, end = [int(t) for t in args.window.split(":")]
+    except ValueError:
+        print(f"Bad window {args.window}: should be START:END, e.g. 100:200")
+        sys.exit(1)
+    s.set_window(start, end)
+
+if args.json_file != "":
+    if args.resume != "" and s.trace is None:
+        print("The checkpoint was saved without -j, so it has no JSON stats to resume")
+        sys.exit(1)
+    json_out = open(args.json_file, "w")
+    if args.resume != "":
+        # the stats so far come from the checkpoint
+        s.trace.out = json_out
+    else:
+        s.trace = JsonTrace(json_out, s.get_num_processes())
+else:
+    s.trace = None
+
+(cpu_busy, io_busy, clock_tick) = s.run(args.engine)
+
+if s.trace is not None:
+    s.trace.close()
+    json_out.close()
 
 if args.print_stats:
     print("")
     print(f"Stats: Total Time {clock_tick}")
     print("Stats: CPU Busy {} ({:.2%})".format(cpu_busy, float(cpu_busy) / clock_tick))
     print("Stats: I/O Busy {} ({:.2%})".format(io_busy, float(io_busy) / clock_tick))
+    if s.num_cpus > 1 or s.num_devices > 0:
+        for cpu, busy in enumerate(s.cpu_busy_ticks):
+            print(
+                "Stats: CPU {} Busy {} ({:.2%})".format(
+                    cpu, busy, float(busy) / clock_tick
+                )
+            )
+        for device, busy in enumerate(s.device_busy_ticks):
+            print(
+                "Stats: Device {} Busy {} ({:.2%})".format(
+                    device, busy, float(busy) / clock_tick
+                )
+            )
     print("")
@@ -4,6 +4,7 @@ This file generates a "process tree" for processes that fork or are forked by
 each other.
 """
 from argparse import ArgumentParser
+import itertools
 import random
 import sys
 import string
@@ -17,6 +18,230 @@ def random_choice(L):
     return L[random_randint(0, len(L) - 1)]
 
 
+# the names Forker.get_name() hands out, in the same order, made as needed:
+# b..Z, then aa..ZZ, then aaa..ZZZ, ...
+def process_names():
+    base = string.ascii_lowercase + string.ascii_uppercase
+    yield from base[1:]
+    for length in itertools.count(2):
+        for letters in itertools.product(base, repeat=length):
+            yield "".join(letters)
+
+
+def random_action_batches(actions, fork_percentage, root_name="a", batch=1 << 16):
+    """
+    Yields `actions` random fork ("p+c") and exit ("p-") actions, in lists of
+    up to `batch`, for a tree that starts as just the root. The live
+    processes are kept in an array and an exit swaps the last one into the
+    hole, so picking and removing both take constant time. Each action still
+    costs a few Python-level steps (two draws, a pick and a string), so this
+    writes about half a million actions a second (10M take under 20s).
+
+    The odds of each action are the same as in Forker.run(), but where run()
+    draws again when it picks the root to exit, this picks exits among the
+    other processes directly, so a seed gives different actions than run().
+    """
+    rand = random.random
+    names = process_names()
+    exit_percentage = 1 - fork_percentage
+    # every live process but the root
+    live = []
+    done = 0
+    while done < actions:
+        n = min(batch, actions - done)
+        draws = iter([rand() for _ in range(2 * n)])
+        out = []
+        for kind, pick in zip(draws, draws):
+            m = len(live)
+            forks = fork_percentage * (m + 1)
+            if kind * (forks + exit_percentage * m) < forks:
+                # FORK
+                j = int(pick * (m + 1))
+                child = next(names)
+                out.append(f"{root_name if j == m else live[j]}+{child}")
+                live.append(child)
+            else:
+                # EXIT
+                j = int(pick * m)
+                out.append(f"{live[j]}-")
+                live[j] = live[-1]
+                live.pop()
+        done += n
+        yield out
+
+
+def random_actions(actions, fork_percentage, root_name="a"):
+    return itertools.chain.from_iterable(
+        random_action_batches(actions, fork_percentage, root_name)
+    )
+
+
+# writes batches of actions to out, one action per line
+def write_actions(out, batches):
+    for batch in batches:
+        out.write("\n".join(batch))
+        out.write("\n")
+    return
+
+
+# reads actions lazily from a file with one action (a+b or b-) per line; a
+# line can also hold several comma-separated actions, as with -A
+# empty lines and #-comments are skipped
+def read_actions(file):
+    for line in file:
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        for a in line.split(","):
+            yield a
+
+
+class ProcessTree:
+    """
+    The process tree, indexed by process name. Every process knows its
+    parent, its first and last child and its previous and next sibling, so
+    adding a process, removing it or moving it to another parent never
+    searches a list.
+    """
+
+    def __init__(self, root) -> None:
+        self.root = root
+        self.parent = {root: None}
+        self.first_child = {root: None}
+        self.last_child = {root: None}
+        self.prev_sibling = {root: None}
+        self.next_sibling = {root: None}
+        return
+
+    def __contains__(self, p):
+        return p in self.parent
+
+    def __len__(self):
+        return len(self.parent)
+
+    # the children of p, oldest first
+    def children(self, p):
+        c = self.first_child[p]
+        while c is not None:
+            yield c
+            c = self.next_sibling[c]
+
+    # p and all its descendants, in preorder; walks the sibling and parent
+    # links, so it needs no stack however deep the tree is
+    def subtree(self, p):
+        first_child, next_sibling, parent = (
+            self.first_child,
+            self.next_sibling,
+            self.parent,
+        )
+        yield p
+        c = first_child[p]
+        while c is not None:
+            yield c
+            if first_child[c] is not None:
+                c = first_child[c]
+                continue
+            while c != p and next_sibling[c] is None:
+                c = parent[c]
+            if c == p:
+                return
+            c = next_sibling[c]
+
+    def has_children(self, p):
+        return self.first_child[p] is not None
+
+    # links c (which must not be in any child list) as the last child of p
+    def append_child(self, p, c):
+        last = self.last_child[p]
+        self.parent[c] = p
+        self.prev_sibling[c] = last
+        self.next_sibling[c] = None
+        if last is None:
+            self.first_child[p] = c
+        else:
+            self.next_sibling[last] = c
+        self.last_child[p] = c
+        return
+
+    # takes c out of its parent's child list
+    def unlink(self, c):
+        p = self.parent[c]
+        prev, next = self.prev_sibling[c], self.next_sibling[c]
+        if prev is None:
+            self.first_child[p] = next
+        else:
+            self.next_sibling[prev] = next
+        if next is None:
+            self.last_child[p] = prev
+        else:
+            self.prev_sibling[next] = prev
+        self.prev_sibling[c] = None
+        self.next_sibling[c] = None
+        return
+
+    def add(self, p, c):
+        self.first_child[c] = None
+        self.last_child[c] = None
+        self.append_child(p, c)
+        return
+
+    # removes c, which must not have children any more
+    def remove(self, c):
+        self.unlink(c)
+        del self.parent[c]
+        del self.first_child[c]
+        del self.last_child[c]
+        del self.prev_sibling[c]
+        del self.next_sibling[c]
+        return
+
+    # moves all the children of p, in order, to the end of new_parent's
+    # child list
+    def move_children(self, p, new_parent):
+        first, last = self.first_child[p], self.last_child[p]
+        if first is None:
+            return
+        for c in self.children(p):
+            self.parent[c] = new_parent
+        tail = self.last_child[new_parent]
+        self.prev_sibling[first] = tail
+        if tail is None:
+            self.first_child[new_parent] = first
+        else:
+            self.next_sibling[tail] = first
+        self.last_child[new_parent] = last
+        self.first_child[p] = None
+        self.last_child[p] = None
+        return
+
+    # moves all the descendants of p, in preorder and without children of
+    # their own, to the end of new_parent's child list: they are relinked
+    # into one chain in a single pass, which is then spliced in at once
+    def move_descendants(self, p, new_parent):
+        desc = list(self.subtree(p))
+        if len(desc) == 1:
+            return
+        parent, first_child, last_child = self.parent, self.first_child, self.last_child
+        prev_sibling, next_sibling = self.prev_sibling, self.next_sibling
+        tail = last_child[new_parent]
+        prev = tail
+        for d in desc[1:]:
+            parent[d] = new_parent
+            first_child[d] = None
+            last_child[d] = None
+            prev_sibling[d] = prev
+            if prev is not None:
+                next_sibling[prev] = d
+            prev = d
+        next_sibling[prev] = None
+        if tail is None:
+            first_child[new_parent] = desc[1]
+        last_child[new_parent] = prev
+        first_child[p] = None
+        last_child[p] = None
+        return
+
+
 class Forker:
     def __init__(
         self,
@@ -29,6 +254,8 @@ class Forker:
         local_reparent,
         print_style,
         solve,
+        diff=False,
+        action_source=None,
     ) -> None:
         self.fork_percentage = fork_percentage
         self.max_actions = actions
@@ -39,16 +266,17 @@ class Forker:
         self.local_reparent = local_reparent
         self.print_style = print_style
         self.solve = solve
+        self.diff = diff
+        # an iterable of actions (e.g. read_actions()) to use instead of
+        # action_list; it is consumed one action at a time
+        self.action_source = action_source
+        # (kind, process, new parent) of everything the last action changed
+        self.changes = []
 
         # root process is always `a`
         self.root_name = "a"
 
-        self.process_list = [self.root_name]
-
-        self.children = {}
-        self.children[self.root_name] = []
-
-        self.parents = {}
+        self.tree = ProcessTree(self.root_name)
 
         # pretty printing
         self.name_length = 1
@@ -75,14 +303,21 @@ class Forker:
         self.curr_index += 1
         return name
 
-    def walk(self, p, level, pmask, is_last):
-        print(f"{' ':31}", end="")
+    # the lines of the tree, root first, each child below its parent; the
+    # tree is walked with an explicit stack, so any depth works
+    def tree_lines(self):
+        pad = f"{' ':31}"
+        first_child, last_child = self.tree.first_child, self.tree.last_child
+        prev_sibling = self.tree.prev_sibling
         if self.print_style == "basic":
-            for _ in range(level):
-                print(f"{' ':3}", end="")
-            print(f"{p:2}")
-            for child in self.children[p]:
-                self.walk(child, level + 1, {}, False)
+            stack = [(self.root_name, 0)]
+            while stack:
+                p, level = stack.pop()
+                yield f"{pad}{'   ' * level}{p:2}"
+                c = last_child[p]
+                while c is not None:
+                    stack.append((c, level + 1))
+                    c = prev_sibling[c]
             return
         if self.print_style == "line1":
             chars = ("|", "-", "+", "|")
@@ -91,87 +326,105 @@ class Forker:
         elif self.print_style == "fancy":
             chars = ("\u2502", "\u2500", "\u251c", "\u2514")
         else:
-            print(f"BAD style {self.print_style}!")
+            print(f"{pad}BAD style {self.print_style}!")
             sys.exit(1)
-
-        # print stuff before the node
-        if level > 0:  # root has level of 0
-            for i in range(level - 1):
-                if pmask[i]:
-                    # "|  "
-                    print(f"{chars[0]}   ", end="")
-                else:
-                    print(f"{' ':4}", end="")
-            if pmask[level - 1]:
-                # "|__"
-                if is_last:
-                    print(f"{chars[3]}{chars[1]}{chars[1]} ", end="")
-                else:
-                    print(f"{chars[2]}{chars[1]}{chars[1]} ", end="")
+        # "|__" before a child, "|  " below a child that has younger siblings
+        branch = f"{chars[2]}{chars[1]}{chars[1]} "
+        last_branch = f"{chars[3]}{chars[1]}{chars[1]} "
+        vertical = f"{chars[0]}   "
+        # columns[i] goes before every line below the child at level i + 1
+        columns = []
+        stack = [(self.root_name, 0, False)]
+        while stack:
+            p, level, is_last = stack.pop()
+            if level == 0:
+                yield f"{pad}{p}"
             else:
-                # "___"
-                print(" {chars[1]}{chars[1]}{chars[1]} ", end="")
-
-        # print the node
-        print(f"{p}")
-
-        # undo parent verticals
-        if is_last:
-            pmask[level - 1] = False
-
-        # recurse
-        pmask[level] = True
-        for child in self.children[p][:-1]:
-            self.walk(child, level + 1, pmask, False)
-        for child in self.children[p][-1:]:
-            self.walk(child, level + 1, pmask, True)
+                del columns[level - 1 :]
+                prefix = "".join(columns)
+                yield f"{pad}{prefix}{last_branch if is_last else branch}{p}"
+                columns.append("    " if is_last else vertical)
+            c = last_child[p]
+            if c is not None:
+                stack.append((c, level + 1, True))
+                c = prev_sibling[c]
+                while c is not None:
+                    stack.append((c, level + 1, False))
+                    c = prev_sibling[c]
+        return
+
+    # prints lines in large chunks rather than one print() per line
+    def write_lines(self, lines, chunk_lines=4096):
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) == chunk_lines:
+                chunk.append("")
+                sys.stdout.write("\n".join(chunk))
+                chunk = []
+        if chunk:
+            chunk.append("")
+            sys.stdout.write("\n".join(chunk))
         return
 
     def print_tree(self):
-        return self.walk(self.root_name, 0, {}, False)
+        return self.write_lines(self.tree_lines())
+
+    # prints what the last action changed in the tree: the processes added
+    # (+), removed (-) or moved to a new parent (~)
+    def print_changes(self):
+        pad = f"{' ':31}"
+        if self.changes == []:
+            lines = [f"{pad}(no change)"]
+        else:
+            lines = [
+                f"{pad}{kind} {p}"
+                if parent is None
+                else f"{pad}{kind} {p} (parent {parent})"
+                for kind, p, parent in self.changes
+            ]
+        self.changes = []
+        return self.write_lines(lines)
+
+    # the tree after an action: all of it, or just what changed (-d)
+    def print_update(self):
+        if self.diff:
+            return self.print_changes()
+        return self.print_tree()
 
     def do_fork(self, p, c):
-        self.process_list.append(c)
-        self.children[c] = []
-        self.children[p].append(c)
-        self.parents[c] = p
+        self.tree.add(p, c)
+        if self.diff:
+            self.changes.append(("+", c, p))
         return f"{p} forks {c}"
 
     def collect_children(self, p):
-        if self.children[p] == []:
-            return [p]
-        else:
-            L = [p]
-            for c in self.children[p]:
-                L += self.collect_children(c)
-            return L
+        return list(self.tree.subtree(p))
 
     def do_exit(self, p):
-        # remove the process from the process_list
+        # the root process can never exit
         if p == self.root_name:
             print("root process: CANNOT exit!")
             sys.exit(1)
-        exit_parent = self.parents[p]
-        self.process_list.remove(p)
+        exit_parent = self.tree.parent[p]
+        if self.diff:
+            self.changes.append(("-", p, None))
+            if self.local_reparent:
+                moved = list(self.tree.children(p))
+            else:
+                moved = self.collect_children(p)[1:]
+            new_parent = exit_parent if self.local_reparent else self.root_name
+            self.changes += [("~", d, new_parent) for d in moved]
 
         # for each orphan, set its parent to exiting process's parent or root
         if self.local_reparent:
-            for orphan in self.children[p]:
-                self.parents[orphan] = exit_parent
-                self.children[exit_parent].append(orphan)
+            self.tree.move_children(p, exit_parent)
         else:
             # set ALL descendants to be child of ROOT
-            desc = self.collect_children(p)
-            desc.remove(p)
-            for d in desc:
-                self.children[d] = []
-                self.parents[d] = self.root_name
-                self.children[self.root_name].append(d)
-
-        # remove the entry from its parent's child list
-        self.children[exit_parent].remove(p)
-        self.children[p] = -1  # should NEVER be used again
-        self.parents[p] = -1  # should NEVER be used again
+            self.tree.move_descendants(p, self.root_name)
+
+        # remove the process from the tree
+        self.tree.remove(p)
 
         return f"{p} EXITS!"
 
@@ -200,7 +453,9 @@ class Forker:
         self.print_tree()
         print("")
 
-        if self.action_list != "":
+        if self.action_source is not None:
+            action_list = self.action_source
+        elif self.action_list != "":
             # use specific (user-provided) action_list
             action_list = self.action_list.split(",")
         else:
@@ -230,14 +485,14 @@ class Forker:
             tmp = self.check_legal(a)
             if len(tmp) == 2:
                 fork_choice, new_child = tmp[0], tmp[1]
-                if fork_choice not in self.process_list:
+                if fork_choice not in self.tree or new_child in self.tree:
                     self.bad_action(a)
                 action = self.do_fork(fork_choice, new_child)
             else:
                 exit_choice = tmp[0]
-                if exit_choice not in self.process_list:
+                if exit_choice not in self.tree:
                     self.bad_action(a)
-                if self.leaf_only and len(self.children[exit_choice]) > 0:
+                if self.leaf_only and self.tree.has_children(exit_choice):
                     action = f"{exit_choice} EXITS (FAILED: has children!)"
                 else:
                     action = self.do_exit(exit_choice)
@@ -247,12 +502,12 @@ class Forker:
                 else:
                     print("Action?")
                 if not self.just_final:
-                    self.print_tree()
+                    self.print_update()
             else:
                 print("Action:", action)
                 if not self.just_final:
                     if self.solve:
-                        self.print_tree()
+                        self.print_update()
                     else:
                         print("Process Tree?")
         if self.just_final:
@@ -270,125 +525,187 @@ class Forker:
         return
 
 
-# Main running point
-
-# Parse args
-parser = ArgumentParser()
-parser.add_argument(
-    "-s",
-    "--seed",
-    default=-1,
-    help="the random seed",
-    action="store",
-    type=int,
-    dest="seed",
-)
-parser.add_argument(
-    "-f",
-    "--forks",
-    default=0.7,
-    help="percent of actions that are forks (NOT exits)",
-    action="store",
-    type=float,
-    dest="fork_percentage",
-)
-parser.add_argument(
-    "-A",
-    "--action_list",
-    default="",
-    help="the action list, instead of randomly generated ones (format: a+b,b+c,b- means a fork b, b fork c, b exit)",
-    action="store",
-    dest="action_list",
-)
-parser.add_argument(
-    "-a",
-    "--actions",
-    default=5,
-    help="number of forks/exits to do",
-    action="store",
-    type=int,
-    dest="actions",
-)
-parser.add_argument(
-    "-t",
-    "--show_tree",
-    default=False,
-    help="show tree (not actions)",
-    action="store_true",
-    dest="show_tree",
-)
-parser.add_argument(
-    "-P",
-    "--print_style",
-    default="fancy",
-    help="tree print style (basic, line1, line2, fancy)",
-    action="store",
-    dest="print_style",
-)
-parser.add_argument(
-    "-F",
-    "--final_only",
-    default=False,
-    help="just show the final state!",
-    action="store_true",
-    dest="just_final",
-)
-parser.add_argument(
-    "-L",
-    "--leaf_only",
-    default=False,
-    help="only leaf processes exit",
-    action="store_true",
-    dest="leaf_only",
-)
-parser.add_argument(
-    "-R",
-    "--local_reparent",
-    default=False,
-    help="reparent to local parent",
-    action="store_true",
-    dest="local_reparent",
-)
-parser.add_argument(
-    "-c",
-    "--compute",
-    default=False,
-    help="compute answers for me",
-    action="store_true",
-    dest="solve",
-)
-
-args = parser.parse_args()
-
-if args.seed != -1:
-    random.seed(args.seed)
-
-if args.fork_percentage <= 0.001:
-    print("fork_percentage must be > 0.001")
-    sys.exit(1)
-
-print("")
-print("ARG seed", args.seed)
-print("ARG fork_percentage", args.fork_percentage)
-print("ARG actions", args.actions)
-print("ARG action_list", args.action_list)
-print("ARG show_tree", args.show_tree)
-print("ARG just_final", args.just_final)
-print("ARG leaf_only", args.leaf_only)
-print("ARG local_reparent", args.local_reparent)
-print("ARG print_style", args.print_style)
-print("ARG solve", args.solve)
-print("")
-
-f = Forker(
-    args.fork_percentage,
-    args.actions,
-    args.action_list,
-    args.show_tree,
-    args.just_final,
-    args.leaf_only,
-    args.local_reparent,
-    args.print_style,
-    args.solve,
-)
-f.run()
+def make_parser():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--seed",
+        default=-1,
+        help="the random seed",
+        action="store",
+        type=int,
+        dest="seed",
+    )
+    parser.add_argument(
+        "-f",
+        "--forks",
+        default=0.7,
+        help="percent of actions that are forks (NOT exits)",
+        action="store",
+        type=float,
+        dest="fork_percentage",
+    )
+    parser.add_argument(
+        "-A",
+        "--action_list",
+        default="",
+        help="the action list, instead of randomly generated ones (format: a+b,b+c,b- means a fork b, b fork c, b exit)",
+        action="store",
+        dest="action_list",
+    )
+    parser.add_argument(
+        "-a",
+        "--actions",
+        default=5,
+        help="number of forks/exits to do (random ones come from the original generator, so a seed still gives the same actions; -w uses a faster one)",
+        action="store",
+        type=int,
+        dest="actions",
+    )
+    parser.add_argument(
+        "-w",
+        "--write_actions",
+        default="",
+        help="just write -a random actions, one per line, to this file (- for stdout); the actions differ from the ones -a gives run() for the same seed",
+        action="store",
+        dest="write_actions",
+    )
+    parser.add_argument(
+        "-t",
+        "--show_tree",
+        default=False,
+        help="show tree (not actions)",
+        action="store_true",
+        dest="show_tree",
+    )
+    parser.add_argument(
+        "-P",
+        "--print_style",
+        default="fancy",
+        help="tree print style (basic, line1, line2, fancy)",
+        action="store",
+        dest="print_style",
+    )
+    parser.add_argument(
+        "-F",
+        "--final_only",
+        default=False,
+        help="just show the final state!",
+        action="store_true",
+        dest="just_final",
+    )
+    parser.add_argument(
+        "-L",
+        "--leaf_only",
+        default=False,
+        help="only leaf processes exit",
+        action="store_true",
+        dest="leaf_only",
+    )
+    parser.add_argument(
+        "-R",
+        "--local_reparent",
+        default=False,
+        help="reparent to local parent",
+        action="store_true",
+        dest="local_reparent",
+    )
+    parser.add_argument(
+        "-d",
+        "--diff",
+        default=False,
+        help="after each action, only show the processes it added, removed or moved",
+        action="store_true",
+        dest="diff",
+    )
+    parser.add_argument(
+        "-i",
+        "--action_file",
+        default="",
+        help="read the actions from this file (- for stdin), one per line, instead of -A",
+        action="store",
+        dest="action_file",
+    )
+    parser.add_argument(
+        "-c",
+        "--compute",
+        default=False,
+        help="compute answers for me",
+        action="store_true",
+        dest="solve",
+    )
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+
+    if args.seed != -1:
+        random.seed(args.seed)
+
+    if args.fork_percentage <= 0.001:
+        print("fork_percentage must be > 0.001")
+        sys.exit(1)
+
+    if args.action_file != "" and args.action_list != "":
+        print("use either an action list (-A) or an action file (-i), not both")
+        sys.exit(1)
+
+    if args.write_actions != "":
+        actions = random_action_batches(args.actions, args.fork_percentage)
+        if args.write_actions == "-":
+            write_actions(sys.stdout, actions)
+        else:
+            with open(args.write_actions, "w") as out:
+                write_actions(out, actions)
+        return
+
+    action_file = None
+    action_source = None
+    if args.action_file == "-":
+        action_source = read_actions(sys.stdin)
+    elif args.action_file != "":
+        try:
+            action_file = open(args.action_file)
+        except OSError as e:
+            print(f"cannot read action file {args.action_file}: {e.strerror}")
+            sys.exit(1)
+        action_source = read_actions(action_file)
+
+    print("")
+    print("ARG seed", args.seed)
+    print("ARG fork_percentage", args.fork_percentage)
+    print("ARG actions", args.actions)
+    print("ARG action_list", args.action_list)
+    if args.action_file != "":
+        print("ARG action_file", args.action_file)
+    print("ARG show_tree", args.show_tree)
+    print("ARG just_final", args.just_final)
+    print("ARG leaf_only", args.leaf_only)
+    print("ARG local_reparent", args.local_reparent)
+    print("ARG print_style", args.print_style)
+    print("ARG solve", args.solve)
+    print("")
+
+    f = Forker(
+        args.fork_percentage,
+        args.actions,
+        args.action_list,
+        args.show_tree,
+        args.just_final,
+        args.leaf_only,
+        args.local_reparent,
+        args.print_style,
+        args.solve,
+        args.diff,
+        action_source,
+    )
+    if action_file is None:
+        f.run()
+    else:
+        with action_file:
+            f.run()
+
+
+if __name__ == "__main__":
+    main()
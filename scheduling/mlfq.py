@@ -1,5 +1,8 @@
 #! /usr/bin/env python3
 from argparse import ArgumentParser
+from collections import deque
+from contextlib import nullcontext
+import heapq
 import random
 import sys
 from enum import Enum
@@ -9,313 +12,35 @@ class JobStatus(Enum):
     IO_DONE = "IO_DONE"
 
 
-class Key(Enum):
-    CURR_PRIORITY = "curr_priority"
-    ALLOT_LEFT = "allot_left"
-    TICKS_LEFT = "ticks_left"
-    DOING_IO = "doing_io"
-    TIME_LEFT = "time_left"
-    FIRST_RUN = "first_run"
-
-
-# Parse Arguments
-parser = ArgumentParser()
-parser.add_argument(
-    "-s",
-    "--seed",
-    help="the random seed",
-    default=0,
-    action="store",
-    type=int,
-    dest="seed",
-)
-parser.add_argument(
-    "-n",
-    "--numQueues",
-    help="number of queues in MLFQ (if not using -Q)",
-    default=3,
-    action="store",
-    type=int,
-    dest="num_queues",
-)
-parser.add_argument(
-    "-q",
-    "--quantum",
-    help="length of time slice (if not using -Q)",
-    default=10,
-    action="store",
-    type=int,
-    dest="quantum",
-)
-parser.add_argument(
-    "-a",
-    "--allotment",
-    help="length of allotment (if not using -A)",
-    default=1,
-    action="store",
-    type=int,
-    dest="allotment",
-)
-parser.add_argument(
-    "-Q",
-    "--quantumList",
-    help="length of time slice per queue level, specified as "
-    + "x,y,z,... where x is the quatum length of the highest "
-    + "priority queue, y the next highest, and so forth",
-    default="",
-    action="store",
-    dest="quantum_list",
-)
-parser.add_argument(
-    "-A",
-    "--allotmentList",
-    help="length of time allotment per queue level, specified as "
-    + "x,y,z,... where x is the # of time slices for the highest "
-    + "priority queue, y the next highest, and so forth",
-    default="",
-    action="store",
-    dest="allotment_list",
-)
-parser.add_argument(
-    "-j",
-    "--numJobs",
-    help="number of jobs in the sytem",
-    default=3,
-    action="store",
-    type=int,
-    dest="num_jobs",
-)
-parser.add_argument(
-    "-m",
-    "--maxLen",
-    help="max runtime of a job (if randomly generating)",
-    default=100,
-    action="store",
-    type=int,
-    dest="max_len",
-)
-parser.add_argument(
-    "-M",
-    "--maxIO",
-    help="max I/O frequency of a job (if randomly generating)",
-    default=10,
-    action="store",
-    type=int,
-    dest="max_io",
-)
-parser.add_argument(
-    "-B",
-    "--boost",
-    help="how often to boost the priority of all jobs back to high priority",
-    default=0,
-    action="store",
-    type=int,
-    dest="boost",
-)
-parser.add_argument(
-    "-i",
-    "--ioTime",
-    help="how long an I/O should last (fixed constant)",
-    default=5,
-    action="store",
-    type=int,
-    dest="io_time",
-)
-parser.add_argument(
-    "-S",
-    "--stay",
-    help="reset and stay at same priority level when issuing I/O",
-    default=False,
-    action="store_true",
-    dest="stay",
-)
-parser.add_argument(
-    "-I",
-    "--ioBump",
-    help="if specified, jobs that finished I/O move immediately to front of current queue",
-    default=False,
-    action="store_true",
-    dest="io_bump",
-)
-parser.add_argument(
-    "-l",
-    "--jobList",
-    help="a comma-separated list of jobs to run, in the form x1,y1,z1:x2,y2,z2:... where x is start time, y is run time, and z is how often the job issues an I/O request",
-    default="",
-    action="store",
-    dest="job_list",
-)
-parser.add_argument(
-    "-c",
-    help="compute answers for me",
-    default=False,
-    action="store_true",
-    dest="solve",
-)
-
-args = parser.parse_args()
-
-
-# MLFQ: how many queues
-num_queues = args.num_queues
-
-# queue_level -> time slice length
-quantum_dict = {}
-if args.quantum_list != "":
-    # extract number of queues and their time slices from args
-    quantum_lens = args.quantum_list.split(",")
-    num_queues = len(quantum_lens)
-    q_idx = num_queues - 1
-    for i in range(num_queues):
-        quantum_dict[q_idx] = int(quantum_lens[i])
-        q_idx -= 1
-
-else:
-    for i in range(num_queues):
-        quantum_dict[i] = int(args.quantum)
-
-allotment_dict = {}
-if args.allotment_list != "":
-    allotment_lens = args.allotment_list.split(",")
-    if num_queues != len(allotment_lens):
-        print("number of allotments must match number of quantums!")
-        exit(1)
-    q_idx = num_queues - 1
-
-    for i in range(num_queues):
-        allotment_len = int(allotment_lens[i])
-        if q_idx != 0 and allotment_len <= 0:
-            print("allotment must be positive integer!")
-            exit(1)
-        allotment_dict[q_idx] = allotment_len
-        q_idx -= 1
-else:
-    for i in range(num_queues):
-        allotment_dict[i] = int(args.allotment)
-
-
-io_time = int(args.io_time)
-
-# tracks when I/Os and other interrupts are complete
-io_done_dict = {}
-
-# stores all info about jobs
-job_dict = {}
-job_idx = 0
-hi_q = num_queues - 1
-
-random.seed(args.seed)
-
-if args.job_list != "":
-    all_jobs = args.job_list.split(":")
-    for j in all_jobs:
-        job_info = j.split(",")
-        if len(job_info) != 3:
-            print("job string is in wrong format! shoudl be x1,y1,z1:x2,y2,z2:...")
-            exit(1)
-        assert len(job_info) == 3
-        start_time = int(job_info[0])
-        run_time = int(job_info[1])
-        io_freq = int(job_info[2])
-        job_dict[job_idx] = {
-            Key.CURR_PRIORITY: hi_q,
-            Key.TICKS_LEFT: quantum_dict[hi_q],
-            Key.ALLOT_LEFT: allotment_dict[hi_q],
-            "start_time": start_time,
-            "run_time": run_time,
-            Key.TIME_LEFT: run_time,
-            "io_freq": io_freq,
-            Key.DOING_IO: False,
-            Key.FIRST_RUN: -1,
-        }
-
-        if start_time not in io_done_dict:
-            io_done_dict[start_time] = []
-        io_done_dict[start_time].append((job_idx, "JOB BEGINS"))
-        job_idx += 1
-else:
-    # randomly generate jobs
-    for j in range(args.num_jobs):
-        start_time = 0
-        run_time = int(random.random() * (args.max_len - 1) + 1)
-        io_freq = int(random.random() * (args.max_io - 1) + 1)
-        job_dict[job_idx] = {
-            Key.CURR_PRIORITY: hi_q,
-            Key.TICKS_LEFT: quantum_dict[hi_q],
-            Key.ALLOT_LEFT: allotment_dict[hi_q],
-            "start_time": start_time,
-            "run_time": run_time,
-            Key.TIME_LEFT: run_time,
-            "io_freq": io_freq,
-            Key.DOING_IO: False,
-            Key.FIRST_RUN: -1,
-        }
-        if start_time not in io_done_dict:
-            io_done_dict[start_time] = []
-        io_done_dict[start_time].append((job_idx, "JOB BEGINS"))
-        job_idx += 1
-
-num_jobs = len(job_dict)
-
-
-print("Here is the list of inputs:")
-print("OPTIONS jobs", num_jobs)
-print("OPTIONS queues", num_queues)
-for i in range(len(quantum_dict) - 1, -1, -1):
-    print(f"OPTIONS allotments for queue {i:2} is {allotment_dict[i]:3}")
-    print(f"OPTIONS quantum length for queue {i:2} is {quantum_dict[i]:3}")
-print("OPTIONS boost", args.boost)
-print("OPTIONS ioTime", args.io_time)
-print("OPTIONS stayAfterIO", args.stay)
-print("OPTIONS iobump", args.io_bump)
-
-print("\n")
-print("For each job, three defining characteristics are given:")
-print("  startTime : at what time does the job enter the system")
-print("  runTime   : the total CPU time needed by the job to finish")
-print("  ioFreq    : every ioFreq time units, the job issues an I/O")
-print("              (the I/O takes ioTime units to complete)\n")
-
-print("Job List:")
-for i in range(num_jobs):
-    start_time = job_dict[i]["start_time"]
-    run_time = job_dict[i]["run_time"]
-    io_freq = job_dict[i]["io_freq"]
-    print(
-        f"  Job {i:2}: startTime {start_time:3} - runTime {run_time:3} - ioFreq {io_freq:3}"
+class Job:
+    __slots__ = (
+        "start_time",
+        "run_time",
+        "io_freq",
+        "curr_priority",
+        "ticks_left",
+        "allot_left",
+        "time_left",
+        "doing_io",
+        "first_run",
+        "end_time",
+        "boost_epoch",
     )
-print("")
-
-if args.solve == False:
-    print("Compute the execution trace for the given workloads.")
-    print("If you would like, also compute the response and turnaround")
-    print("times for each of the jobs.")
-    print("")
-    print("Use the -c flag to get the exact results when you are finished.\n")
-    exit(0)
-
-# Initialize the MLFQ queue
-queue = {}
-for q in range(num_queues):
-    queue[q] = []
-
-curr_time = 0
 
-total_num_jobs = len(job_dict)
-num_finished_jobs = 0
-
-
-# Finds the highest non-empty queue
-# reutrn -1 if they are all empty
-def find_queue():
-    q = hi_q
-    while q > 0:
-        if len(queue[q]) > 0:
-            return q
-        q -= 1
-    if len(queue[q]) > 0:
-        return 0
-    return -1
+    def __init__(self, start_time, run_time, io_freq, priority, ticks, allot) -> None:
+        self.start_time = start_time
+        self.run_time = run_time
+        self.io_freq = io_freq
+        self.curr_priority = priority
+        self.ticks_left = ticks
+        self.allot_left = allot
+        self.time_left = run_time
+        self.doing_io = False
+        self.first_run = -1
+        self.end_time = -1
+        # number of boosts this job has seen
+        self.boost_epoch = 0
+        return
 
 
 def abort_job(str):
@@ -323,163 +48,837 @@ def abort_job(str):
     exit(1)
 
 
-print("\nExecution Trace:\n")
-
-while num_finished_jobs < total_num_jobs:
-    # Find job with highest priority
-    # run it runtil either:
-    #   - job uses up its time quantum
-    #   - job performs an I/O
-
-    # check for piority boost
-    if args.boost > 0 and curr_time != 0:
-        # note boost is _how often_ to boost
-        if curr_time % args.boost == 0:
-            print(f"[ time {curr_time} ] BOOST ( every {args.boost} )")
-            # Remove _all_ jobs from queues except for the highest queue
-            # Put them in the highest queue
-            for q in range(num_queues - 1):
-                for j in queue[q]:
-                    if job_dict[j][Key.DOING_IO] is False:
-                        queue[hi_q].append(j)
-                queue[q] = []
-
-            # change priority to highest
-            for j in range(num_jobs):
-                if job_dict[j][Key.TIME_LEFT] > 0:
-                    job_dict[j][Key.CURR_PRIORITY] = hi_q
-                    job_dict[j][Key.TICKS_LEFT] = allotment_dict[hi_q]
-
-    # check for any I/Os done
-    if curr_time in io_done_dict:
-        for j_id, type in io_done_dict[curr_time]:
-            q = job_dict[j_id][Key.CURR_PRIORITY]
-            job_dict[j_id][Key.DOING_IO] = False
-            print(f"[ time {curr_time} ] {type} by JOB {j_id}")
-            if args.io_bump is False or type == "JOB BEGINS":
-                queue[q].append(j_id)
+# job list looks like this:
+#   x1,y1,z1:x2,y2,z2:...
+# where x is start time, y is run time, and z is how often the job issues an I/O
+# returns a list of (start_time, run_time, io_freq) tuples
+def parse_job_list(job_list):
+    jobs = []
+    for j in job_list.split(":"):
+        job_info = j.split(",")
+        if len(job_info) != 3:
+            raise ValueError(
+                "job string is in wrong format! shoudl be x1,y1,z1:x2,y2,z2:..."
+            )
+        jobs.append((int(job_info[0]), int(job_info[1]), int(job_info[2])))
+    return jobs
+
+
+# reads jobs lazily from a file with one x,y,z job per line, where x is start
+# time, y is run time, and z is how often the job issues an I/O
+# jobs must be sorted by start time; empty lines and #-comments are skipped
+def read_jobs(file):
+    last_start_time = 0
+    for line_num, line in enumerate(file, 1):
+        line = line.strip()
+        if line == "" or line.startswith("#"):
+            continue
+        job_info = line.split(",")
+        if len(job_info) != 3:
+            raise ValueError(f"line {line_num}: job should be in the form x,y,z")
+        try:
+            start_time, run_time, io_freq = [int(x) for x in job_info]
+        except ValueError:
+            raise ValueError(f"line {line_num}: x, y and z should be integers")
+        if start_time < last_start_time:
+            raise ValueError(f"line {line_num}: jobs must be sorted by start time")
+        last_start_time = start_time
+        yield (start_time, run_time, io_freq)
+
+
+# randomly generate jobs, all starting at time 0
+# the same seed always produces the same jobs
+def random_jobs(num_jobs, max_len, max_io, seed=0):
+    rand = random.Random(seed)
+    jobs = []
+    for j in range(num_jobs):
+        run_time = int(rand.random() * (max_len - 1) + 1)
+        io_freq = int(rand.random() * (max_io - 1) + 1)
+        jobs.append((0, run_time, io_freq))
+    return jobs
+
+
+class TraceBuffer:
+    """
+    Collects execution trace lines and writes them to `out` in large chunks,
+    instead of one write per line.
+    """
+
+    def __init__(self, out, chunk_lines=8192) -> None:
+        self.out = out
+        self.chunk_lines = chunk_lines
+        self.lines = []
+        return
+
+    def add(self, line):
+        self.lines.append(line)
+        if len(self.lines) >= self.chunk_lines:
+            self.flush()
+        return
+
+    def flush(self):
+        if len(self.lines) > 0:
+            self.lines.append("")
+            self.out.write("\n".join(self.lines))
+            self.lines = []
+        return
+
+
+class MLFQStats:
+    def __init__(self) -> None:
+        # per-job results, indexed by job id (not kept for streamed workloads)
+        self.start_times = []
+        self.response_times = []
+        self.turnaround_times = []
+        self.num_jobs = 0
+        self.response_sum = 0
+        self.turnaround_sum = 0
+        # time at which the last job finished
+        self.total_time = 0
+        return
+
+    def add_job(self, start_time, response, turnaround, keep=True):
+        if keep:
+            self.start_times.append(start_time)
+            self.response_times.append(response)
+            self.turnaround_times.append(turnaround)
+        self.num_jobs += 1
+        self.response_sum += response
+        self.turnaround_sum += turnaround
+        return
+
+    @property
+    def avg_response(self):
+        if self.num_jobs == 0:
+            return 0.0
+        return float(self.response_sum) / self.num_jobs
+
+    @property
+    def avg_turnaround(self):
+        if self.num_jobs == 0:
+            return 0.0
+        return float(self.turnaround_sum) / self.num_jobs
+
+
+class MLFQSimulator:
+    """
+    A multi-level feedback queue scheduler. The configuration is fixed at
+    construction time; `run()` and `run_stream()` can then be called any number
+    of times, with a different workload each time.
+    """
+
+    def __init__(
+        self,
+        num_queues=3,
+        quantum=10,
+        allotment=1,
+        quantum_list="",
+        allotment_list="",
+        boost=0,
+        io_time=5,
+        stay=False,
+        io_bump=False,
+        engine="tick",
+        out=None,
+        stats_only=False,
+    ) -> None:
+        # queue_level -> time slice length
+        self.quantum_dict = {}
+        if quantum_list != "":
+            # extract number of queues and their time slices from quantum_list
+            quantum_lens = quantum_list.split(",")
+            num_queues = len(quantum_lens)
+            q_idx = num_queues - 1
+            for i in range(num_queues):
+                self.quantum_dict[q_idx] = int(quantum_lens[i])
+                q_idx -= 1
+        else:
+            for i in range(num_queues):
+                self.quantum_dict[i] = int(quantum)
+
+        self.allotment_dict = {}
+        if allotment_list != "":
+            allotment_lens = allotment_list.split(",")
+            if num_queues != len(allotment_lens):
+                raise ValueError("number of allotments must match number of quantums!")
+            q_idx = num_queues - 1
+            for i in range(num_queues):
+                allotment_len = int(allotment_lens[i])
+                if q_idx != 0 and allotment_len <= 0:
+                    raise ValueError("allotment must be positive integer!")
+                self.allotment_dict[q_idx] = allotment_len
+                q_idx -= 1
+        else:
+            for i in range(num_queues):
+                self.allotment_dict[i] = int(allotment)
+
+        if engine not in ("tick", "event"):
+            raise ValueError(f"unknown engine {engine} (should be tick or event)")
+
+        # MLFQ: how many queues
+        self.num_queues = num_queues
+        self.hi_q = num_queues - 1
+        self.boost = boost
+        self.io_time = int(io_time)
+        self.stay = stay
+        self.io_bump = io_bump
+        self.engine = engine
+        # where the execution trace goes (default: stdout)
+        self.out = out
+        # if set, no trace is produced at all
+        self.stats_only = stats_only
+
+        # the MLFQ queues, kept around (and emptied) between runs
+        self.queue = []
+        for q in range(num_queues):
+            self.queue.append(deque())
+        # bit q is set iff queue q is non-empty
+        self.occupied = 0
+        return
+
+    # Finds the highest non-empty queue
+    # reutrn -1 if they are all empty
+    def find_queue(self):
+        return self.occupied.bit_length() - 1
+
+    # add a job to the back of a queue
+    def enqueue(self, q, j_id):
+        self.queue[q].append(j_id)
+        self.occupied |= 1 << q
+        return
+
+    # add a job to the front of a queue (I/O bump)
+    def enqueue_front(self, q, j_id):
+        self.queue[q].appendleft(j_id)
+        self.occupied |= 1 << q
+        return
+
+    # remove the job at the front of a queue
+    def dequeue(self, q):
+        j_id = self.queue[q].popleft()
+        if len(self.queue[q]) == 0:
+            self.occupied &= ~(1 << q)
+        return j_id
+
+    # boosts only move the queued jobs; every other job picks up the boosts it
+    # missed the next time the scheduler looks at it
+    def catch_up(self, job):
+        if job.boost_epoch != self.boost_epoch:
+            job.boost_epoch = self.boost_epoch
+            if job.time_left > 0:
+                job.curr_priority = self.hi_q
+                job.ticks_left = self.allotment_dict[self.hi_q]
+        return
+
+    # schedule an I/O completion
+    # events at the same time are handled in the order they were added, after
+    # any job arrivals at that time
+    def add_event(self, time, j_id, type):
+        heapq.heappush(self.events, (time, 1, self.event_seq, j_id, type))
+        self.event_seq += 1
+        return
+
+    # add a job to the job table and schedule its arrival
+    def admit(self, start_time, run_time, io_freq):
+        hi_q = self.hi_q
+        job = Job(
+            start_time,
+            run_time,
+            io_freq,
+            hi_q,
+            self.quantum_dict[hi_q],
+            self.allotment_dict[hi_q],
+        )
+        j_id = self.num_admitted
+        self.num_admitted += 1
+        if self.streaming:
+            self.jobs[j_id] = job
+        else:
+            self.jobs.append(job)
+        heapq.heappush(self.events, (start_time, 0, j_id, j_id, "JOB BEGINS"))
+        return
+
+    # streamed workloads: admit the next job from the source, if any
+    def admit_next(self):
+        try:
+            start_time, run_time, io_freq = next(self.job_source)
+        except StopIteration:
+            return
+        except ValueError:
+            if self.trace is not None:
+                self.trace.flush()
+            raise
+        self.admit(start_time, run_time, io_freq)
+        return
+
+    # Number of ticks until the next boost or I/O completion (or job arrival),
+    # i.e. the next time the scheduler has to make a decision on its own
+    # return -1 if there is no such event pending
+    def ticks_to_next_event(self):
+        curr_time = self.curr_time
+        next_time = -1
+        if len(self.events) > 0:
+            next_time = self.events[0][0]
+        if self.boost > 0:
+            next_boost = (curr_time // self.boost + 1) * self.boost
+            if next_time == -1 or next_boost < next_time:
+                next_time = next_boost
+        if next_time == -1:
+            return -1
+        return next_time - curr_time
+
+    # Number of ticks the job at the head of queue can run before something
+    # (end of quantum, I/O, job completion, boost, I/O completion) happens
+    # the tick engine always runs a single tick
+    def ticks_to_run(self, j_id):
+        if self.engine == "tick":
+            return 1
+        job = self.jobs[j_id]
+        run_ticks = job.time_left
+        # a non-positive ticks_left never counts down to zero
+        if 0 < job.ticks_left < run_ticks:
+            run_ticks = job.ticks_left
+        io_freq = job.io_freq
+        if io_freq > 0:
+            done = job.run_time - job.time_left
+            run_ticks = min(run_ticks, io_freq - done % io_freq)
+        next_event = self.ticks_to_next_event()
+        if next_event > 0:
+            run_ticks = min(run_ticks, next_event)
+        return run_ticks
+
+    def abort(self, str):
+        if self.trace is not None:
+            self.trace.flush()
+        abort_job(str)
+
+    # jobs is a list of (start_time, run_time, io_freq) tuples
+    def run(self, jobs):
+        return self.simulate(jobs, False)
+
+    # jobs is an iterable of (start_time, run_time, io_freq) tuples, sorted by
+    # start time; it is consumed lazily, each job entering the job table only
+    # when the previous one arrives, and finished jobs are dropped, so memory
+    # stays bounded by the number of jobs in the system
+    # only aggregate stats are kept
+    def run_stream(self, jobs):
+        return self.simulate(jobs, True)
+
+    def simulate(self, jobs, streaming):
+        if self.stats_only:
+            self.trace = None
+        else:
+            self.trace = TraceBuffer(self.out if self.out is not None else sys.stdout)
+        trace = self.trace
+        num_queues = self.num_queues
+        hi_q = self.hi_q
+        quantum_dict = self.quantum_dict
+        allotment_dict = self.allotment_dict
+        queue = self.queue
+        for q in range(num_queues):
+            queue[q].clear()
+        self.occupied = 0
+
+        # tracks when jobs arrive and I/Os are complete: a min-heap of
+        # (time, kind, seq, job id, type), kind putting arrivals (0) before
+        # I/O completions (1) and seq keeping simultaneous events in order
+        self.events = []
+        self.event_seq = 0
+        events = self.events
+
+        # stores all info about jobs, indexed by job id
+        # (a dict of the jobs still in the system when streaming)
+        self.streaming = streaming
+        self.num_admitted = 0
+        stats = MLFQStats()
+        if streaming:
+            self.jobs = {}
+            self.job_source = iter(jobs)
+            self.admit_next()
+        else:
+            self.jobs = []
+            for start_time, run_time, io_freq in jobs:
+                self.admit(start_time, run_time, io_freq)
+        job_table = self.jobs
+
+        self.curr_time = 0
+        self.boost_epoch = 0
+
+        # every unfinished job is either queued, or waiting to arrive or for
+        # an I/O to complete
+        while self.occupied != 0 or len(events) > 0:
+            curr_time = self.curr_time
+            # Find job with highest priority
+            # run it runtil either:
+            #   - job uses up its time quantum
+            #   - job performs an I/O
+
+            # check for piority boost
+            if self.boost > 0 and curr_time != 0:
+                # note boost is _how often_ to boost
+                if curr_time % self.boost == 0:
+                    if trace is not None:
+                        trace.add(f"[ time {curr_time} ] BOOST ( every {self.boost} )")
+                    # Remove _all_ jobs from queues except for the highest queue
+                    # Put them in the highest queue, lowest queue first
+                    lower = self.occupied & ~(1 << hi_q)
+                    while lower != 0:
+                        q = (lower & -lower).bit_length() - 1
+                        lower &= lower - 1
+                        for j in queue[q]:
+                            if job_table[j].doing_io is False:
+                                queue[hi_q].append(j)
+                        queue[q].clear()
+                    if len(queue[hi_q]) > 0:
+                        self.occupied = 1 << hi_q
+                    else:
+                        self.occupied = 0
+
+                    # change priority to highest, lazily (see catch_up)
+                    self.boost_epoch += 1
+
+            # check for any I/Os done
+            while len(events) > 0 and events[0][0] <= curr_time:
+                _, _, _, j_id, type = heapq.heappop(events)
+                if streaming and type == "JOB BEGINS":
+                    self.admit_next()
+                job = job_table[j_id]
+                self.catch_up(job)
+                q = job.curr_priority
+                job.doing_io = False
+                if trace is not None:
+                    trace.add(f"[ time {curr_time} ] {type} by JOB {j_id}")
+                if self.io_bump is False or type == "JOB BEGINS":
+                    self.enqueue(q, j_id)
+                else:
+                    self.enqueue_front(q, j_id)
+
+            # Find the highest priority job
+            curr_queue = self.find_queue()
+            if curr_queue == -1:
+                idle_ticks = 1
+                if self.engine == "event":
+                    idle_ticks = self.ticks_to_next_event()
+                    if idle_ticks <= 0:
+                        self.abort("ERROR: idle with no pending events!")
+                if trace is not None:
+                    for t in range(curr_time, curr_time + idle_ticks):
+                        trace.add(f"[ time {t} ] IDLE")
+                self.curr_time += idle_ticks
+                continue
+
+            # at lease one runnable job
+            curr_job = queue[curr_queue][0]
+            job = job_table[curr_job]
+            self.catch_up(job)
+            curr_priority = job.curr_priority
+            if curr_priority != curr_queue:
+                self.abort(
+                    f"curr_priority {curr_priority} does NOT match curr_queue {curr_queue}"
+                )
+
+            # run the job until the next decision point (a single tick with the
+            # tick engine); nothing else can happen in between
+            run_ticks = self.ticks_to_run(curr_job)
+            job.time_left -= run_ticks
+            job.ticks_left -= run_ticks
+
+            if job.first_run == -1:
+                job.first_run = curr_time
+
+            run_time = job.run_time
+            io_freq = job.io_freq
+            ticks_left = job.ticks_left
+            allot_left = job.allot_left
+            time_left = job.time_left
+
+            if trace is not None:
+                for t in range(run_ticks - 1, -1, -1):
+                    trace.add(
+                        f"[ time {curr_time} ] Run JOB {curr_job} at PRIORITY {curr_queue} [ TICKS {ticks_left + t} ALLOT {allot_left:d} TIME {time_left + t} (of {run_time}) ]"
+                    )
+                    curr_time += 1
             else:
-                queue[q].insert(0, j_id)
-
-    # Find the highest priority job
-    curr_queue = find_queue()
-    if curr_queue == -1:
-        print(f"[ time {curr_time} ] IDLE")
-        curr_time += 1
-        continue
-
-    # at lease one runnable job
-    curr_job = queue[curr_queue][0]
-    curr_priority = job_dict[curr_job][Key.CURR_PRIORITY]
-    if curr_priority != curr_queue:
-        abort_job(
-            f"curr_priority {curr_priority} does NOT match curr_queue {curr_queue}"
+                curr_time += run_ticks
+            self.curr_time = curr_time
+
+            if time_left < 0:
+                self.abort("ERROR: should never have less than 0 time left to run!")
+
+            # Check for JOB ending
+            if time_left == 0:
+                if trace is not None:
+                    trace.add(f"[ time {curr_time} ] FINISHED JOB {curr_job}")
+                job.end_time = curr_time
+                done_job = self.dequeue(curr_queue)
+                assert done_job == curr_job
+                if streaming:
+                    start_time = job.start_time
+                    stats.add_job(
+                        start_time,
+                        job.first_run - start_time,
+                        curr_time - start_time,
+                        keep=False,
+                    )
+                    del job_table[curr_job]
+                continue
+
+            # Check for I/O
+            io_issued = False
+            if io_freq > 0 and (((run_time - time_left) % io_freq) == 0):
+                # Issue an I/O
+                if trace is not None:
+                    trace.add(f"[ time {curr_time} ] IO_START by JOB {curr_job}")
+                io_issued = True
+                desched = self.dequeue(curr_queue)
+                assert desched == curr_job
+                job.doing_io = True
+                if self.stay:
+                    job.ticks_left = quantum_dict[curr_queue]
+                    job.allot_left = allotment_dict[curr_queue]
+
+                # Add to I/O queue
+                if trace is not None:
+                    trace.add("IO DONE")
+                self.add_event(curr_time + self.io_time, curr_job, JobStatus.IO_DONE)
+
+            # Check for quantum ending at this level
+            # BUT there still may be allotment left
+            # quantum: length of time slice
+            if ticks_left == 0:
+                if io_issued is False:
+                    # I/O NOT been issued - pop from queue
+                    desched = self.dequeue(curr_queue)
+                assert desched == curr_job
+
+                job.allot_left -= 1
+
+                # job can have multiple allotments - multiple slices
+                if job.allot_left == 0:
+                    # job is DONE at _this_ level
+                    # Move on to next queue
+                    if curr_queue > 0:
+                        # change priority of the curr_job
+                        job.curr_priority = curr_queue - 1
+                        job.ticks_left = quantum_dict[curr_queue - 1]
+                        # allotment:
+                        job.allot_left = allotment_dict[curr_queue - 1]
+                        if io_issued is False:
+                            self.enqueue(curr_queue - 1, curr_job)
+                    else:
+                        # lowest queue
+                        job.ticks_left = quantum_dict[curr_queue]
+                        job.allot_left = allotment_dict[curr_queue]
+                        if io_issued is False:
+                            self.enqueue(curr_queue, curr_job)
+                else:
+                    # this job has more time at this level
+                    # just push it to the end of queue
+                    job.ticks_left = quantum_dict[curr_queue]
+                    if io_issued is False:
+                        self.enqueue(curr_queue, curr_job)
+
+        if trace is not None:
+            trace.flush()
+
+        if not streaming:
+            for job in job_table:
+                start_time = job.start_time
+                stats.add_job(
+                    start_time, job.first_run - start_time, job.end_time - start_time
+                )
+        stats.total_time = self.curr_time
+        return stats
+
+
+def make_parser():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-s",
+        "--seed",
+        help="the random seed",
+        default=0,
+        action="store",
+        type=int,
+        dest="seed",
+    )
+    parser.add_argument(
+        "-n",
+        "--numQueues",
+        help="number of queues in MLFQ (if not using -Q)",
+        default=3,
+        action="store",
+        type=int,
+        dest="num_queues",
+    )
+    parser.add_argument(
+        "-q",
+        "--quantum",
+        help="length of time slice (if not using -Q)",
+        default=10,
+        action="store",
+        type=int,
+        dest="quantum",
+    )
+    parser.add_argument(
+        "-a",
+        "--allotment",
+        help="length of allotment (if not using -A)",
+        default=1,
+        action="store",
+        type=int,
+        dest="allotment",
+    )
+    parser.add_argument(
+        "-Q",
+        "--quantumList",
+        help="length of time slice per queue level, specified as "
+        + "x,y,z,... where x is the quatum length of the highest "
+        + "priority queue, y the next highest, and so forth",
+        default="",
+        action="store",
+        dest="quantum_list",
+    )
+    parser.add_argument(
+        "-A",
+        "--allotmentList",
+        help="length of time allotment per queue level, specified as "
+        + "x,y,z,... where x is the # of time slices for the highest "
+        + "priority queue, y the next highest, and so forth",
+        default="",
+        action="store",
+        dest="allotment_list",
+    )
+    parser.add_argument(
+        "-j",
+        "--numJobs",
+        help="number of jobs in the sytem",
+        default=3,
+        action="store",
+        type=int,
+        dest="num_jobs",
+    )
+    parser.add_argument(
+        "-m",
+        "--maxLen",
+        help="max runtime of a job (if randomly generating)",
+        default=100,
+        action="store",
+        type=int,
+        dest="max_len",
+    )
+    parser.add_argument(
+        "-M",
+        "--maxIO",
+        help="max I/O frequency of a job (if randomly generating)",
+        default=10,
+        action="store",
+        type=int,
+        dest="max_io",
+    )
+    parser.add_argument(
+        "-B",
+        "--boost",
+        help="how often to boost the priority of all jobs back to high priority",
+        default=0,
+        action="store",
+        type=int,
+        dest="boost",
+    )
+    parser.add_argument(
+        "-i",
+        "--ioTime",
+        help="how long an I/O should last (fixed constant)",
+        default=5,
+        action="store",
+        type=int,
+        dest="io_time",
+    )
+    parser.add_argument(
+        "-S",
+        "--stay",
+        help="reset and stay at same priority level when issuing I/O",
+        default=False,
+        action="store_true",
+        dest="stay",
+    )
+    parser.add_argument(
+        "-I",
+        "--ioBump",
+        help="if specified, jobs that finished I/O move immediately to front of current queue",
+        default=False,
+        action="store_true",
+        dest="io_bump",
+    )
+    parser.add_argument(
+        "-l",
+        "--jobList",
+        help="a comma-separated list of jobs to run, in the form x1,y1,z1:x2,y2,z2:... where x is start time, y is run time, and z is how often the job issues an I/O request",
+        default="",
+        action="store",
+        dest="job_list",
+    )
+    parser.add_argument(
+        "-f",
+        "--jobFile",
+        help="stream jobs from this file (- for stdin) instead, one x,y,z job "
+        + "per line, sorted by start time; jobs enter the simulation as they "
+        + "arrive and only aggregate stats are reported",
+        default="",
+        action="store",
+        dest="job_file",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        help="simulation engine: tick (advance one tick at a time) or event "
+        + "(jump straight to the next scheduling decision)",
+        default="tick",
+        choices=["tick", "event"],
+        action="store",
+        dest="engine",
+    )
+    parser.add_argument(
+        "--stats-only",
+        help="do not produce the execution trace, only the final stats "
+        + "(only useful with -c)",
+        default=False,
+        action="store_true",
+        dest="stats_only",
+    )
+    parser.add_argument(
+        "-t",
+        "--traceFile",
+        help="write the execution trace to this file instead of stdout",
+        default="",
+        action="store",
+        dest="trace_file",
+    )
+    parser.add_argument(
+        "-c",
+        help="compute answers for me",
+        default=False,
+        action="store_true",
+        dest="solve",
+    )
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+
+    try:
+        sim = MLFQSimulator(
+            num_queues=args.num_queues,
+            quantum=args.quantum,
+            allotment=args.allotment,
+            quantum_list=args.quantum_list,
+            allotment_list=args.allotment_list,
+            boost=args.boost,
+            io_time=args.io_time,
+            stay=args.stay,
+            io_bump=args.io_bump,
+            engine=args.engine,
+            stats_only=args.stats_only,
         )
+        # (only a file opened here gets closed, once the run ends)
+        job_file = None
+        if args.job_file == "-":
+            jobs = read_jobs(sys.stdin)
+        elif args.job_file != "":
+            try:
+                job_file = open(args.job_file)
+            except OSError as e:
+                print(f"Cannot read job file {args.job_file}: {e.strerror}")
+                exit(1)
+            jobs = read_jobs(job_file)
+        elif args.job_list != "":
+            jobs = parse_job_list(args.job_list)
+        else:
+            jobs = random_jobs(args.num_jobs, args.max_len, args.max_io, args.seed)
+    except ValueError as e:
+        print(e)
+        exit(1)
 
-    job_dict[curr_job][Key.TIME_LEFT] -= 1
-    job_dict[curr_job][Key.TICKS_LEFT] -= 1
+    streaming = args.job_file != ""
+
+    print("Here is the list of inputs:")
+    if streaming:
+        print("OPTIONS jobFile", args.job_file)
+    else:
+        print("OPTIONS jobs", len(jobs))
+    print("OPTIONS queues", sim.num_queues)
+    for i in range(len(sim.quantum_dict) - 1, -1, -1):
+        print(f"OPTIONS allotments for queue {i:2} is {sim.allotment_dict[i]:3}")
+        print(f"OPTIONS quantum length for queue {i:2} is {sim.quantum_dict[i]:3}")
+    print("OPTIONS boost", args.boost)
+    print("OPTIONS ioTime", args.io_time)
+    print("OPTIONS stayAfterIO", args.stay)
+    print("OPTIONS iobump", args.io_bump)
+
+    print("\n")
+    print("For each job, three defining characteristics are given:")
+    print("  startTime : at what time does the job enter the system")
+    print("  runTime   : the total CPU time needed by the job to finish")
+    print("  ioFreq    : every ioFreq time units, the job issues an I/O")
+    print("              (the I/O takes ioTime units to complete)\n")
+
+    print("Job List:")
+    if streaming:
+        print(f"  (streamed from {args.job_file})")
+    else:
+        for i, (start_time, run_time, io_freq) in enumerate(jobs):
+            print(
+                f"  Job {i:2}: startTime {start_time:3} - runTime {run_time:3} - ioFreq {io_freq:3}"
+            )
+    print("")
 
-    if job_dict[curr_job][Key.FIRST_RUN] == -1:
-        job_dict[curr_job][Key.FIRST_RUN] = curr_time
+    if args.solve == False:
+        print("Compute the execution trace for the given workloads.")
+        print("If you would like, also compute the response and turnaround")
+        print("times for each of the jobs.")
+        print("")
+        print("Use the -c flag to get the exact results when you are finished.\n")
+        exit(0)
+
+    if streaming:
+        run = sim.run_stream
+    else:
+        run = sim.run
+    try:
+        with job_file or nullcontext():
+            if args.stats_only:
+                stats = run(jobs)
+            elif args.trace_file != "":
+                with open(args.trace_file, "w") as trace_file:
+                    trace_file.write("\nExecution Trace:\n\n")
+                    sim.out = trace_file
+                    stats = run(jobs)
+            else:
+                print("\nExecution Trace:\n")
+                stats = run(jobs)
+    except ValueError as e:
+        print(e)
+        exit(1)
 
-    run_time = job_dict[curr_job]["run_time"]
-    io_freq = job_dict[curr_job]["io_freq"]
-    ticks_left = job_dict[curr_job][Key.TICKS_LEFT]
-    allot_left = job_dict[curr_job][Key.ALLOT_LEFT]
-    time_left = job_dict[curr_job][Key.TIME_LEFT]
+    # Print out stats
+    print("")
+    print("Final stats:")
+    if streaming:
+        print(f"  Jobs {stats.num_jobs}")
+    for i in range(len(stats.start_times)):
+        start_time = stats.start_times[i]
+        response = stats.response_times[i]
+        turnaround = stats.turnaround_times[i]
+        print(
+            f"  Job {i:2d}: startTime {start_time:3d} - response {response:3d} - turnaround {turnaround:3d}"
+        )
 
     print(
-        f"[ time {curr_time} ] Run JOB {curr_job} at PRIORITY {curr_queue} [ TICKS {ticks_left} ALLOT {allot_left:d} TIME {time_left} (of {run_time}) ]"
+        f"\n  Avg response {stats.avg_response:.2f} - turnaround {stats.avg_turnaround:.2f}"
     )
+    print("\n")
 
-    if time_left < 0:
-        abort_job("ERROR: should never have less than 0 time left to run!")
-
-    # UPDATE TIME
-    curr_time += 1
-
-    # Check for JOB ending
-    if time_left == 0:
-        print(f"[ time {curr_time} ] FINISHED JOB {curr_job}")
-        num_finished_jobs += 1
-        job_dict[curr_job]["end_time"] = curr_time
-        done_job = queue[curr_queue].pop(0)
-        assert done_job == curr_job
-        continue
-
-    # Check for I/O
-    io_issued = False
-    if io_freq > 0 and (((run_time - time_left) % io_freq) == 0):
-        # Issue an I/O
-        print(f"[ time {curr_time} ] IO_START by JOB {curr_job}")
-        io_issued = True
-        desched = queue[curr_queue].pop(0)
-        assert desched == curr_job
-        job_dict[curr_job][Key.DOING_IO] = True
-        if args.stay:
-            job_dict[curr_job][Key.TICKS_LEFT] = quantum_dict[curr_queue]
-            job_dict[curr_job][Key.ALLOT_LEFT] = allot_left[curr_queue]
-
-        # Add to I/O queue
-        future_time = curr_time + io_time
-        if future_time not in io_done_dict:
-            io_done_dict[future_time] = []
-        print("IO DONE")
-        io_done_dict[future_time].append((curr_job, JobStatus.IO_DONE))
-
-    # Check for quantum ending at this level
-    # BUT there still may be allotment left
-    # quantum: length of time slice
-    if ticks_left == 0:
-        if io_issued is False:
-            # I/O NOT been issued - pop from queue
-            desched = queue[curr_queue].pop(0)
-        assert desched == curr_job
-
-        job_dict[curr_job][Key.ALLOT_LEFT] = job_dict[curr_job][Key.ALLOT_LEFT] - 1
-
-        # job can have multiple allotments - multiple slices
-        if job_dict[curr_job][Key.ALLOT_LEFT] == 0:
-            # job is DONE at _this_ level
-            # Move on to next queue
-            if curr_queue > 0:
-                # change priority of the curr_job
-                job_dict[curr_job][Key.CURR_PRIORITY] = curr_queue - 1
-                job_dict[curr_job][Key.TICKS_LEFT] = quantum_dict[curr_queue - 1]
-                # allotment:
-                job_dict[curr_job][Key.ALLOT_LEFT] = allotment_dict[curr_queue - 1]
-                if io_issued is False:
-                    queue[curr_queue - 1].append(curr_job)
-            else:
-                # lowest queue
-                job_dict[curr_job][Key.TICKS_LEFT] = quantum_dict[curr_queue]
-                job_dict[curr_job][Key.ALLOT_LEFT] = allotment_dict[curr_queue]
-                if io_issued is False:
-                    queue[curr_queue].append(curr_job)
-        else:
-            # this job has more time at this level
-            # just push it to the end of queue
-            job_dict[curr_job][Key.TICKS_LEFT] = quantum_dict[curr_queue]
-            if io_issued is False:
-                queue[curr_queue].append(curr_job)
-
-# Print out stats
-print("")
-print("Final stats:")
-response_sum = 0
-turnaround_sum = 0
-
-for i in range(num_jobs):
-    start_time = job_dict[i]["start_time"]
-    response = job_dict[i][Key.FIRST_RUN] - start_time
-    turnaround = job_dict[i]["end_time"] - start_time
-    print(
-        f"  Job {i:2d}: startTime {start_time:3d} - response {response:3d} - turnaround {turnaround:3d}"
-    )
-    response_sum += response
-    turnaround_sum += turnaround
 
-avg_response = float(response_sum) / num_jobs
-avg_turnaround = float(turnaround_sum) / num_jobs
-print(f"\n  Avg response {avg_response:.2f} - turnaround {avg_turnaround:.2f}")
-print("\n")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#! /usr/bin/env python3
+"""
+Simulates many independent randomly generated MLFQ workloads (one per seed)
+at once, in lockstep, with NumPy arrays holding one row per replica. Gives
+exactly the same results as running mlfq.py once per seed. Requires NumPy.
+"""
+from argparse import ArgumentParser
+import csv
+
+import numpy as np
+
+from mlfq import MLFQSimulator, random_jobs
+
+
+class MLFQBatchStats:
+    def __init__(self, seeds, response_times, turnaround_times, total_times):
+        self.seeds = seeds
+        # (replicas, jobs) arrays
+        self.response_times = response_times
+        self.turnaround_times = turnaround_times
+        # (replicas,) arrays
+        self.total_times = total_times
+        self.avg_response = response_times.mean(axis=1)
+        self.avg_turnaround = turnaround_times.mean(axis=1)
+        return
+
+
+def run_batch(sim, seeds, num_jobs, max_len, max_io):
+    """
+    Runs the configuration of `sim` (an MLFQSimulator) over the workloads that
+    random_jobs() generates for each of the seeds, and returns an
+    MLFQBatchStats.
+
+    Every replica has its own row in each of the state arrays below, and every
+    loop iteration advances all of them by one tick. The position of a job in
+    its queue is kept as a stamp: the front of queue q is the ready job at
+    priority q with the smallest stamp.
+    """
+    workloads = [random_jobs(num_jobs, max_len, max_io, seed) for seed in seeds]
+    num_replicas = len(seeds)
+    shape = (num_replicas, num_jobs)
+    run_time = np.array([[j[1] for j in w] for w in workloads], dtype=np.int64)
+    io_freq = np.array([[j[2] for j in w] for w in workloads], dtype=np.int64)
+    run_time = run_time.reshape(shape)
+    io_freq = io_freq.reshape(shape)
+
+    hi_q = sim.hi_q
+    quantum = np.array([sim.quantum_dict[q] for q in range(sim.num_queues)])
+    allotment = np.array([sim.allotment_dict[q] for q in range(sim.num_queues)])
+
+    prio = np.full(shape, hi_q, dtype=np.int64)
+    ticks_left = np.full(shape, quantum[hi_q], dtype=np.int64)
+    allot_left = np.full(shape, allotment[hi_q], dtype=np.int64)
+    time_left = run_time.copy()
+    first_run = np.full(shape, -1, dtype=np.int64)
+    end_time = np.full(shape, -1, dtype=np.int64)
+    doing_io = np.zeros(shape, dtype=bool)
+    io_done = np.full(shape, -1, dtype=np.int64)
+
+    # every job begins at time 0, in job order
+    ready = np.ones(shape, dtype=bool)
+    stamp = np.tile(np.arange(num_jobs, dtype=np.int64), (num_replicas, 1))
+    # next stamp for the back of a queue; front stamps count down from -1
+    back_seq = num_jobs
+    front_seq = -1
+
+    job_ids = np.arange(num_jobs, dtype=np.int64)
+    no_stamp = np.iinfo(np.int64).max
+    curr_time = 0
+
+    while not (end_time >= 0).all():
+        # check for piority boost
+        if sim.boost > 0 and curr_time != 0 and curr_time % sim.boost == 0:
+            # queued jobs below the highest queue move to its back, lowest
+            # queue first, keeping their order within each queue
+            moved = ready & (prio < hi_q)
+            if moved.any():
+                order = np.lexsort((stamp, np.where(moved, prio, hi_q)), axis=1)
+                rank = np.empty_like(order)
+                np.put_along_axis(rank, order, job_ids[None, :], axis=1)
+                stamp = np.where(moved, back_seq + rank, stamp)
+                back_seq += num_jobs
+            alive = time_left > 0
+            prio[alive] = hi_q
+            ticks_left[alive] = allotment[hi_q]
+
+        # check for any I/Os done
+        finished_io = doing_io & (io_done == curr_time)
+        if finished_io.any():
+            doing_io &= ~finished_io
+            ready |= finished_io
+            if sim.io_bump:
+                stamp = np.where(finished_io, front_seq, stamp)
+                front_seq -= 1
+            else:
+                stamp = np.where(finished_io, back_seq + job_ids, stamp)
+                back_seq += num_jobs
+
+        # Find the highest priority job of every replica
+        queued_prio = np.where(ready, prio, -1)
+        curr_queue = queued_prio.max(axis=1)
+        rows = np.nonzero(curr_queue >= 0)[0]
+        if len(rows) == 0:
+            # every replica is IDLE
+            curr_time += 1
+            continue
+        candidates = ready & (prio == curr_queue[:, None])
+        curr_job = np.where(candidates, stamp, no_stamp).argmin(axis=1)[rows]
+        curr_queue = curr_queue[rows]
+
+        time_left[rows, curr_job] -= 1
+        ticks_left[rows, curr_job] -= 1
+        never_ran = first_run[rows, curr_job] == -1
+        first_run[rows[never_ran], curr_job[never_ran]] = curr_time
+        curr_time += 1
+
+        # Check for JOB ending
+        left = time_left[rows, curr_job]
+        done = left == 0
+        end_time[rows[done], curr_job[done]] = curr_time
+        ready[rows[done], curr_job[done]] = False
+        rows = rows[~done]
+        curr_job = curr_job[~done]
+        curr_queue = curr_queue[~done]
+        left = left[~done]
+        tick_left = ticks_left[rows, curr_job]
+
+        # Check for I/O
+        freq = io_freq[rows, curr_job]
+        ran = run_time[rows, curr_job] - left
+        io = (freq > 0) & (ran % np.maximum(freq, 1) == 0)
+        io_rows, io_jobs = rows[io], curr_job[io]
+        ready[io_rows, io_jobs] = False
+        doing_io[io_rows, io_jobs] = True
+        io_done[io_rows, io_jobs] = curr_time + sim.io_time
+        if sim.stay:
+            ticks_left[io_rows, io_jobs] = quantum[curr_queue[io]]
+            allot_left[io_rows, io_jobs] = allotment[curr_queue[io]]
+
+        # Check for quantum ending at this level
+        slice_over = tick_left == 0
+        rows, curr_job, curr_queue, io = (
+            rows[slice_over],
+            curr_job[slice_over],
+            curr_queue[slice_over],
+            io[slice_over],
+        )
+        allot = allot_left[rows, curr_job] - 1
+        # job is DONE at _this_ level: move on to next queue (if any)
+        demote = allot == 0
+        new_queue = np.where(demote, np.maximum(curr_queue - 1, 0), curr_queue)
+        prio[rows, curr_job] = new_queue
+        ticks_left[rows, curr_job] = quantum[new_queue]
+        allot_left[rows, curr_job] = np.where(demote, allotment[new_queue], allot)
+        # jobs not doing I/O go to the back of their (new) queue
+        stamp[rows[~io], curr_job[~io]] = back_seq
+        back_seq += 1
+
+    return MLFQBatchStats(seeds, first_run, end_time, end_time.max(axis=1))
+
+
+def make_parser():
+    parser = ArgumentParser(
+        description="run mlfq.py's random workloads for many seeds at once"
+    )
+    parser.add_argument(
+        "-s",
+        "--seeds",
+        help="range of seeds to simulate, as start:stop",
+        default="0:1000",
+        action="store",
+        dest="seeds",
+    )
+    parser.add_argument(
+        "-n",
+        "--numQueues",
+        help="number of queues in MLFQ (if not using -Q)",
+        default=3,
+        action="store",
+        type=int,
+        dest="num_queues",
+    )
+    parser.add_argument(
+        "-q",
+        "--quantum",
+        help="length of time slice (if not using -Q)",
+        default=10,
+        action="store",
+        type=int,
+        dest="quantum",
+    )
+    parser.add_argument(
+        "-a",
+        "--allotment",
+        help="length of allotment (if not using -A)",
+        default=1,
+        action="store",
+        type=int,
+        dest="allotment",
+    )
+    parser.add_argument(
+        "-Q",
+        "--quantumList",
+        help="length of time slice per queue level, as in mlfq.py",
+        default="",
+        action="store",
+        dest="quantum_list",
+    )
+    parser.add_argument(
+        "-A",
+        "--allotmentList",
+        help="length of time allotment per queue level, as in mlfq.py",
+        default="",
+        action="store",
+        dest="allotment_list",
+    )
+    parser.add_argument(
+        "-j",
+        "--numJobs",
+        help="number of jobs in each workload",
+        default=3,
+        action="store",
+        type=int,
+        dest="num_jobs",
+    )
+    parser.add_argument(
+        "-m",
+        "--maxLen",
+        help="max runtime of a job",
+        default=100,
+        action="store",
+        type=int,
+        dest="max_len",
+    )
+    parser.add_argument(
+        "-M",
+        "--maxIO",
+        help="max I/O frequency of a job",
+        default=10,
+        action="store",
+        type=int,
+        dest="max_io",
+    )
+    parser.add_argument(
+        "-B",
+        "--boost",
+        help="how often to boost the priority of all jobs back to high priority",
+        default=0,
+        action="store",
+        type=int,
+        dest="boost",
+    )
+    parser.add_argument(
+        "-i",
+        "--ioTime",
+        help="how long an I/O should last (fixed constant)",
+        default=5,
+        action="store",
+        type=int,
+        dest="io_time",
+    )
+    parser.add_argument(
+        "-S",
+        "--stay",
+        help="reset and stay at same priority level when issuing I/O",
+        default=False,
+        action="store_true",
+        dest="stay",
+    )
+    parser.add_argument(
+        "-I",
+        "--ioBump",
+        help="if specified, jobs that finished I/O move immediately to front of current queue",
+        default=False,
+        action="store_true",
+        dest="io_bump",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="write per-seed results to this CSV file",
+        default="",
+        action="store",
+        dest="output",
+    )
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+
+    try:
+        sim = MLFQSimulator(
+            num_queues=args.num_queues,
+            quantum=args.quantum,
+            allotment=args.allotment,
+            quantum_list=args.quantum_list,
+            allotment_list=args.allotment_list,
+            boost=args.boost,
+            io_time=args.io_time,
+            stay=args.stay,
+            io_bump=args.io_bump,
+        )
+    except ValueError as e:
+        print(e)
+        exit(1)
+
+    low, high = args.seeds.split(":")
+    seeds = list(range(int(low), int(high)))
+    stats = run_batch(sim, seeds, args.num_jobs, args.max_len, args.max_io)
+
+    if args.output != "":
+        with open(args.output, "w", newline="") as out:
+            writer = csv.writer(out)
+            writer.writerow(["seed", "total_time", "avg_response", "avg_turnaround"])
+            for i, seed in enumerate(seeds):
+                writer.writerow(
+                    [
+                        seed,
+                        stats.total_times[i],
+                        f"{stats.avg_response[i]:.2f}",
+                        f"{stats.avg_turnaround[i]:.2f}",
+                    ]
+                )
+
+    print(f"Replicas {len(seeds)} (seeds {low} to {int(high) - 1})")
+    print(
+        f"  Avg response {stats.avg_response.mean():.2f} - turnaround {stats.avg_turnaround.mean():.2f}"
+    )
+    print(
+        f"  Avg response p50 {np.percentile(stats.avg_response, 50):.2f} - p99 {np.percentile(stats.avg_response, 99):.2f}"
+    )
+    print(
+        f"  Avg turnaround p50 {np.percentile(stats.avg_turnaround, 50):.2f} - p99 {np.percentile(stats.avg_turnaround, 99):.2f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+#! /usr/bin/env python3
+"""
+Runs the MLFQ simulator (mlfq.py) over a grid (or a random sample of a grid)
+of scheduler configurations and a range of seeds, in parallel, and writes one
+CSV row per (configuration, seed).
+"""
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import itertools
+import math
+import os
+import random
+import sys
+
+from mlfq import MLFQSimulator, parse_job_list, random_jobs
+
+# the simulator options that can be swept, in CSV column order
+CONFIG_KEYS = (
+    "num_queues",
+    "quantum",
+    "allotment",
+    "quantum_list",
+    "allotment_list",
+    "boost",
+    "io_time",
+    "stay",
+    "io_bump",
+)
+
+PERCENTILES = (50, 90, 99)
+
+STATS_KEYS = (
+    ("num_jobs", "total_time", "avg_response", "avg_turnaround")
+    + tuple(f"response_p{p}" for p in PERCENTILES)
+    + tuple(f"turnaround_p{p}" for p in PERCENTILES)
+)
+
+
+def parse_ints(values):
+    return [int(v) for v in values.split(",")]
+
+
+def parse_bools(values):
+    return [bool(int(v)) for v in values.split(",")]
+
+
+# "0:100" is the range 0..99, anything else is a comma-separated list
+def parse_seeds(seeds):
+    if ":" in seeds:
+        low, high = seeds.split(":")
+        return list(range(int(low), int(high)))
+    return parse_ints(seeds)
+
+
+# nearest-rank percentile of an already sorted list
+def percentile(sorted_values, p):
+    rank = max(math.ceil(p / 100.0 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+# all distinct configurations in the grid, as MLFQSimulator keyword arguments
+# a -Q list sets the number of queues and their quanta, and a -A list the
+# allotments, so the -n/-q (and -a) values they override are left out (None)
+def make_grid(options):
+    configs = []
+    seen = set()
+    for values in itertools.product(*(options[k] for k in CONFIG_KEYS)):
+        config = dict(zip(CONFIG_KEYS, values))
+        if config["quantum_list"] != "":
+            config["num_queues"] = len(config["quantum_list"].split(","))
+            config["quantum"] = None
+        if config["allotment_list"] != "":
+            config["allotment"] = None
+        key = tuple(config.values())
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+    return configs
+
+
+# runs one configuration for every seed; executed in the worker processes
+def run_config(task):
+    config, seeds, workload, engine = task
+    sim = MLFQSimulator(engine=engine, stats_only=True, **config)
+    rows = []
+    for seed in seeds:
+        if workload["job_list"] != "":
+            jobs = parse_job_list(workload["job_list"])
+        else:
+            jobs = random_jobs(
+                workload["num_jobs"], workload["max_len"], workload["max_io"], seed
+            )
+        stats = sim.run(jobs)
+        response = sorted(stats.response_times)
+        turnaround = sorted(stats.turnaround_times)
+        row = dict(config)
+        row["seed"] = seed
+        row["num_jobs"] = len(jobs)
+        row["total_time"] = stats.total_time
+        row["avg_response"] = f"{stats.avg_response:.2f}"
+        row["avg_turnaround"] = f"{stats.avg_turnaround:.2f}"
+        for p in PERCENTILES:
+            row[f"response_p{p}"] = percentile(response, p)
+            row[f"turnaround_p{p}"] = percentile(turnaround, p)
+        rows.append(row)
+    return rows
+
+
+def sweep(configs, seeds, workload, engine="event", workers=None):
+    """
+    Runs every configuration for every seed and returns the result rows,
+    ordered by configuration and then by seed. The results only depend on
+    the configurations and the seeds, never on the number of workers.
+
+    Each task is one configuration and a run of consecutive seeds, small
+    enough that there are a few tasks per worker even for one configuration.
+    """
+    num_workers = workers or os.cpu_count() or 1
+    chunk = max(1, math.ceil(len(configs) * len(seeds) / (4 * num_workers)))
+    tasks = [
+        (config, seeds[i : i + chunk], workload, engine)
+        for config in configs
+        for i in range(0, len(seeds), chunk)
+    ]
+    rows = []
+    if workers == 1:
+        for result in map(run_config, tasks):
+            rows += result
+        return rows
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(run_config, tasks):
+            rows += result
+    return rows
+
+
+def make_parser():
+    parser = ArgumentParser(
+        description="sweep mlfq.py over a grid of configurations and seeds"
+    )
+    parser.add_argument(
+        "-n",
+        "--numQueues",
+        help="comma-separated numbers of queues (if not using -Q)",
+        default="3",
+        action="store",
+        dest="num_queues",
+    )
+    parser.add_argument(
+        "-q",
+        "--quantum",
+        help="comma-separated time slice lengths (if not using -Q)",
+        default="10",
+        action="store",
+        dest="quantum",
+    )
+    parser.add_argument(
+        "-a",
+        "--allotment",
+        help="comma-separated allotment lengths (if not using -A)",
+        default="1",
+        action="store",
+        dest="allotment",
+    )
+    parser.add_argument(
+        "-Q",
+        "--quantumList",
+        help="semicolon-separated per-queue time slice lists, each in the "
+        + "mlfq.py -Q format, e.g. 10,20,40;5,10,20",
+        default="",
+        action="store",
+        dest="quantum_list",
+    )
+    parser.add_argument(
+        "-A",
+        "--allotmentList",
+        help="semicolon-separated per-queue allotment lists, each in the "
+        + "mlfq.py -A format",
+        default="",
+        action="store",
+        dest="allotment_list",
+    )
+    parser.add_argument(
+        "-B",
+        "--boost",
+        help="comma-separated boost periods (0 means no boost)",
+        default="0",
+        action="store",
+        dest="boost",
+    )
+    parser.add_argument(
+        "-i",
+        "--ioTime",
+        help="comma-separated I/O lengths",
+        default="5",
+        action="store",
+        dest="io_time",
+    )
+    parser.add_argument(
+        "-S",
+        "--stay",
+        help="comma-separated stay-after-I/O settings (0 or 1)",
+        default="0",
+        action="store",
+        dest="stay",
+    )
+    parser.add_argument(
+        "-I",
+        "--ioBump",
+        help="comma-separated I/O bump settings (0 or 1)",
+        default="0",
+        action="store",
+        dest="io_bump",
+    )
+    parser.add_argument(
+        "-s",
+        "--seeds",
+        help="seeds to run every configuration with: a range start:stop "
+        + "or a comma-separated list",
+        default="0:10",
+        action="store",
+        dest="seeds",
+    )
+    parser.add_argument(
+        "-j",
+        "--numJobs",
+        help="number of jobs in each randomly generated workload",
+        default=3,
+        action="store",
+        type=int,
+        dest="num_jobs",
+    )
+    parser.add_argument(
+        "-m",
+        "--maxLen",
+        help="max runtime of a job",
+        default=100,
+        action="store",
+        type=int,
+        dest="max_len",
+    )
+    parser.add_argument(
+        "-M",
+        "--maxIO",
+        help="max I/O frequency of a job",
+        default=10,
+        action="store",
+        type=int,
+        dest="max_io",
+    )
+    parser.add_argument(
+        "-l",
+        "--jobList",
+        help="a fixed job list (mlfq.py -l format) instead of random workloads",
+        default="",
+        action="store",
+        dest="job_list",
+    )
+    parser.add_argument(
+        "-r",
+        "--sample",
+        help="run only this many configurations, picked at random from the grid",
+        default=0,
+        action="store",
+        type=int,
+        dest="sample",
+    )
+    parser.add_argument(
+        "-R",
+        "--sampleSeed",
+        help="the random seed used to pick the sampled configurations",
+        default=0,
+        action="store",
+        type=int,
+        dest="sample_seed",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        help="number of worker processes (default: one per core)",
+        default=None,
+        action="store",
+        type=int,
+        dest="workers",
+    )
+    parser.add_argument(
+        "-e",
+        "--engine",
+        help="simulation engine: tick or event",
+        default="event",
+        choices=["tick", "event"],
+        action="store",
+        dest="engine",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="CSV file to write the results to (default: stdout)",
+        default="",
+        action="store",
+        dest="output",
+    )
+    return parser
+
+
+def main():
+    args = make_parser().parse_args()
+
+    options = {
+        "num_queues": parse_ints(args.num_queues),
+        "quantum": parse_ints(args.quantum),
+        "allotment": parse_ints(args.allotment),
+        "quantum_list": args.quantum_list.split(";"),
+        "allotment_list": args.allotment_list.split(";"),
+        "boost": parse_ints(args.boost),
+        "io_time": parse_ints(args.io_time),
+        "stay": parse_bools(args.stay),
+        "io_bump": parse_bools(args.io_bump),
+    }
+    configs = make_grid(options)
+    if 0 < args.sample < len(configs):
+        configs = random.Random(args.sample_seed).sample(configs, args.sample)
+
+    # catch bad configurations before fanning out
+    for config in configs:
+        try:
+            MLFQSimulator(**config)
+        except ValueError as e:
+            print(f"bad configuration {config}: {e}")
+            exit(1)
+
+    workload = {
+        "num_jobs": args.num_jobs,
+        "max_len": args.max_len,
+        "max_io": args.max_io,
+        "job_list": args.job_list,
+    }
+    rows = sweep(configs, parse_seeds(args.seeds), workload, args.engine, args.workers)
+
+    fields = CONFIG_KEYS + ("seed",) + STATS_KEYS
+    if args.output != "":
+        out = open(args.output, "w", newline="")
+    else:
+        out = sys.stdout
+    writer = csv.DictWriter(out, fieldnames=fields)
+    writer.writeheader()
+    writer.writerows(rows)
+    if out is not sys.stdout:
+        out.close()
+
+
+if __name__ == "__main__":
+    main()